@@ -0,0 +1,12 @@
+import pytest
+
+from yatube.test_runner import isolated_settings
+
+
+@pytest.fixture(autouse=True, scope='session')
+def test_settings(tmp_path_factory):
+    """Настройки на весь прогон; для manage.py test их включает
+    yatube.test_runner.TestRunner.
+    """
+    with isolated_settings(str(tmp_path_factory.mktemp('cache'))):
+        yield
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Follow, Group, Post
 
 
@@ -10,6 +11,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        query = search.match_query(search_term)
+        if not query:
+            return queryset, False
+        return queryset.filter(search__text__match=query), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,202 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_GET
+
+from . import comments, conditional, timeline
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+
+# Поля поста в ответе API -> путь для values(). Связанные объекты
+# отдаются плоскими значениями из JOIN, без экземпляров моделей.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+}
+# Ключ курсора всегда читается, даже если его нет в fields=.
+CURSOR_FIELDS = ('pub_date', 'id')
+COMMENT_FIELDS = ('id', 'author__username', 'text', 'created')
+
+
+class FieldsError(ValueError):
+    """Параметр fields= называет поля, которых нет в POST_FIELDS."""
+
+
+def requested_fields(request):
+    """Поля поста из параметра fields=; без него отдаются все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(POST_FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    if not fields:
+        raise FieldsError('Пустой список полей.')
+    unknown = [name for name in fields if name not in POST_FIELDS]
+    if unknown:
+        raise FieldsError('Неизвестные поля: ' + ', '.join(unknown))
+    return fields
+
+
+def value_paths(fields):
+    paths = [POST_FIELDS[name] for name in fields]
+    return paths + [name for name in CURSOR_FIELDS if name not in paths]
+
+
+def serialize(row, fields):
+    """Словарь values() -> объект API только с запрошенными полями."""
+    data = {name: row[POST_FIELDS[name]] for name in fields}
+    if 'image' in data:
+        data['image'] = (
+            default_storage.url(data['image']) if data['image'] else None
+        )
+    return data
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'author': row['author__username'],
+        'text': row['text'],
+        'created': row['created'],
+    }
+
+
+def page_response(request, page, convert, **extra):
+    """Страница в формате API; convert превращает строку в объект."""
+    return JsonResponse({
+        **extra,
+        'results': [convert(row) for row in page],
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
+
+
+def feed_response(request, posts, **extra):
+    """Страница ленты постов из queryset posts в формате API."""
+    try:
+        fields = requested_fields(request)
+    except FieldsError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    paginator = CursorPaginator(
+        posts.values(*value_paths(fields)), settings.MAX_PAGE
+    )
+    page = paginator.get_page(request.GET.get('cursor'))
+    return page_response(
+        request, page, partial(serialize, fields=fields), **extra
+    )
+
+
+def author_data(username):
+    """Автор со счётчиками из UserStats: один запрос с JOIN."""
+    author = User.objects.filter(username=username).values(
+        'id', 'username', 'first_name', 'last_name',
+        'stats__posts_count', 'stats__followers_count',
+        'stats__following_count',
+    ).first()
+    if author is None:
+        raise Http404
+    return author['id'], {
+        'username': author['username'],
+        'full_name': f"{author['first_name']} {author['last_name']}".strip(),
+        'posts_count': author['stats__posts_count'] or 0,
+        'followers_count': author['stats__followers_count'] or 0,
+        'following_count': author['stats__following_count'] or 0,
+    }
+
+
+@require_GET
+@condition(conditional.feed_etag)
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@require_GET
+@condition(conditional.feed_etag)
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).values(
+        'id', 'slug', 'title', 'description'
+    ).first()
+    if group is None:
+        raise Http404
+    group_id = group.pop('id')
+    return feed_response(
+        request, Post.objects.filter(group_id=group_id), group=group
+    )
+
+
+@require_GET
+@condition(conditional.author_etag)
+def profile(request, username):
+    author_id, author = author_data(username)
+    return feed_response(
+        request, Post.objects.filter(author_id=author_id), author=author
+    )
+
+
+@require_GET
+@condition(conditional.author_etag)
+def post_view(request, username, post_id):
+    try:
+        fields = requested_fields(request)
+    except FieldsError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    _, author = author_data(username)
+    post = Post.objects.filter(
+        id=post_id, author__username=username
+    ).values(*value_paths(fields)).first()
+    if post is None:
+        raise Http404
+    first = comments.page(post_id, None, COMMENT_FIELDS)
+    next_cursor = first.next_cursor
+    return JsonResponse({
+        'author': author,
+        'post': serialize(post, fields),
+        'comments': [serialize_comment(row) for row in first],
+        'comments_next': next_cursor and '{}?cursor={}'.format(
+            reverse('api_post_comments', args=[username, post_id]),
+            next_cursor
+        ),
+    })
+
+
+@require_GET
+@condition(conditional.author_etag)
+def post_comments(request, username, post_id):
+    if not Post.objects.filter(
+        id=post_id, author__username=username
+    ).exists():
+        raise Http404
+    page = comments.page(
+        post_id, request.GET.get('cursor'), COMMENT_FIELDS
+    )
+    return page_response(request, page, serialize_comment)
+
+
+@require_GET
+@condition(conditional.follow_etag)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Нужна авторизация.'}, status=401)
+    try:
+        fields = requested_fields(request)
+    except FieldsError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    page = timeline.follow_page(
+        request.user, request.GET.get('cursor'), fields=value_paths(fields)
+    )
+    return page_response(request, page, partial(serialize, fields=fields))
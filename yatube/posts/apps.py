@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def install_search_triggers(using, **kwargs):
+    from .search import install_triggers
+    install_triggers(using)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_triggers, sender=self)
+        from yatube.sqlite import configure
+        connection_created.connect(configure)
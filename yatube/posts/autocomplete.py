@@ -0,0 +1,189 @@
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+
+from . import feed_cache
+from .models import Group, User
+
+GENERATION_KEY = 'posts:autocomplete-generation'
+# Как часто процесс сверяет своё поколение индекса с общим кэшем.
+CHECK_INTERVAL = 5.0
+# Каждое поколение — одна правка в общем кэше: отставший процесс
+# дочитывает их и правит свой индекс, а не строит его из базы заново.
+CHANGES_KEPT = 1000
+CHANGE_TIMEOUT = 24 * 60 * 60
+LIMIT = 10
+USER_FIELDS = {'username', 'first_name', 'last_name'}
+GROUP_FIELDS = {'slug', 'title'}
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def prefixes(text):
+    """Ключи индекса: текст, начиная с каждого из его слов."""
+    words = normalize(text).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+def user_record(pk, username, first_name, last_name):
+    full_name = f'{first_name} {last_name}'.strip()
+    return (
+        ('user', pk),
+        {username, full_name},
+        ('user', username, full_name or username),
+    )
+
+
+def group_record(pk, slug, title):
+    return ('group', pk), {title}, ('group', slug, title)
+
+
+class PrefixIndex:
+    """Отсортированный список пар (ключ, запись) с поиском по префиксу.
+
+    Записи с ключами, начинающимися с запроса, лежат в списке подряд,
+    поэтому поиск — один bisect и проход по соседним элементам.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.records = {}
+        self.generation = None
+        self.checked = 0.0
+
+    def load(self, records, generation):
+        keys, stored = [], {}
+        for record_id, texts, result in records:
+            record_keys = set().union(*map(prefixes, texts))
+            keys.extend((key, record_id) for key in record_keys)
+            stored[record_id] = (record_keys, result)
+        keys.sort()
+        with self.lock:
+            self.keys, self.records = keys, stored
+            self.generation = generation
+
+    def put(self, record_id, texts, result):
+        with self.lock:
+            self._discard(record_id)
+            record_keys = set().union(*map(prefixes, texts))
+            for key in record_keys:
+                bisect.insort(self.keys, (key, record_id))
+            self.records[record_id] = (record_keys, result)
+
+    def discard(self, record_id):
+        with self.lock:
+            self._discard(record_id)
+
+    def _discard(self, record_id):
+        record_keys, _ = self.records.pop(record_id, (set(), None))
+        for key in record_keys:
+            position = bisect.bisect_left(self.keys, (key, record_id))
+            del self.keys[position]
+
+    def search(self, query, limit):
+        query = normalize(query)
+        results, seen = [], set()
+        if not query:
+            return results
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (query,))
+            while position < len(self.keys) and len(results) < limit:
+                key, record_id = self.keys[position]
+                if not key.startswith(query):
+                    break
+                if record_id not in seen:
+                    seen.add(record_id)
+                    results.append(self.records[record_id][1])
+                position += 1
+        return results
+
+
+index = PrefixIndex()
+
+
+def records():
+    users = User.objects.values_list(
+        'pk', 'username', 'first_name', 'last_name'
+    )
+    for row in users.iterator():
+        yield user_record(*row)
+    for row in Group.objects.values_list('pk', 'slug', 'title').iterator():
+        yield group_record(*row)
+
+
+def change_key(generation):
+    return f'{GENERATION_KEY}:{generation}'
+
+
+def apply(change):
+    record_id, record = change
+    if record is None:
+        index.discard(record_id)
+    else:
+        index.put(record_id, *record)
+
+
+def refresh(generation):
+    """Доводит индекс процесса до поколения generation.
+
+    Правки с прошлой сверки читаются из журнала в общем кэше одним
+    get_many; из базы индекс строится заново, только если журнал
+    неполон: процесс отстал больше чем на CHANGES_KEPT правок, записи
+    вытеснены или счётчик поколений начался заново.
+    """
+    start = index.generation
+    if start is not None and 0 < generation - start <= CHANGES_KEPT:
+        keys = [
+            change_key(number)
+            for number in range(start + 1, generation + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) == len(keys):
+            for key in keys:
+                apply(changes[key])
+            index.generation = generation
+            return
+    index.load(records(), generation)
+
+
+def search(query, limit=LIMIT):
+    """Подсказки (тип, slug или username, подпись) по началу слова.
+
+    Индекс строится при первом запросе; дальше база не читается, а
+    правки других процессов приходят через журнал в общем кэше.
+    """
+    now = time.monotonic()
+    if index.generation is None or now - index.checked > CHECK_INTERVAL:
+        generation = feed_cache.generation(GENERATION_KEY)
+        if generation != index.generation:
+            refresh(generation)
+        index.checked = now
+    return index.search(query, limit)
+
+
+def record_of(instance):
+    if isinstance(instance, Group):
+        return group_record(instance.pk, instance.slug, instance.title)
+    return user_record(
+        instance.pk, instance.username, instance.first_name,
+        instance.last_name
+    )
+
+
+def changed(instance, deleted=False):
+    """Правит индекс процесса и пишет правку в журнал для остальных."""
+    record_id, texts, result = record_of(instance)
+    change = (record_id, None if deleted else (texts, result))
+    generation = feed_cache.bump(GENERATION_KEY)
+    cache.set(change_key(generation), change, CHANGE_TIMEOUT)
+    if index.generation is None:
+        return
+    apply(change)
+    # Если поколение сдвинули только мы, индекс процесса актуален.
+    if generation == index.generation + 1:
+        index.generation = generation
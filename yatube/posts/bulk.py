@@ -0,0 +1,29 @@
+import itertools
+from contextlib import contextmanager
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Отключает auto_now_add, чтобы bulk_create сохранил заданные даты,
+    и на выходе возвращает прежние значения.
+
+    Флаг меняется у поля модели, то есть для всего процесса: блок не
+    потокобезопасен и годится только для команд, а не для view.
+    """
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
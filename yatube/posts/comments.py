@@ -0,0 +1,23 @@
+from django.conf import settings
+
+from .models import Comment
+from .paginators import CursorPaginator
+
+ORDERING = ('created', 'id')
+
+
+def page(post_id, cursor, fields=None):
+    """Страница комментариев поста в порядке написания.
+
+    Без fields отдаёт объекты Comment с автором из JOIN, с fields —
+    словари из values(*fields).
+    """
+    comments = Comment.objects.filter(post_id=post_id).order_by(*ORDERING)
+    if fields is None:
+        comments = comments.select_related('author')
+    else:
+        comments = comments.values(*fields)
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PAGE, ordering=ORDERING
+    )
+    return paginator.get_page(cursor)
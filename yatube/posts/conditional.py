@@ -0,0 +1,91 @@
+import hashlib
+
+from yatube.db_router import avoid_lag
+
+from . import feed_cache, follow_graph, suggestions
+from .models import UserStats
+
+
+def validator(request, *parts):
+    """ETag страницы без её рендеринга.
+
+    Поколение ленты сдвигается при любой правке постов, комментариев,
+    групп и имён, поэтому вместе со зрителем и параметрами запроса оно
+    описывает всё, что выводят ленты.
+    """
+    parts = (
+        feed_cache.generation(), request.user.pk, request.GET.urlencode()
+    ) + parts
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def settle():
+    """Строки страницы должны соответствовать поколению в её ETag и
+    ключах фрагментов кэша. Реплика, отставшая от свежего bump(), отдала
+    бы старые строки, и они жили бы под новым поколением до следующей
+    правки, поэтому сразу после сдвига запрос читает из основной базы.
+    """
+    avoid_lag(feed_cache.changed_at())
+
+
+def author_stats(username):
+    """Счётчики карточки автора: поиск по уникальному индексу username."""
+    return UserStats.objects.filter(user__username=username).values_list(
+        'user_id', 'followers_count', 'following_count', 'posts_count'
+    ).first()
+
+
+def feed_etag(request, slug=None):
+    settle()
+    return validator(request, slug)
+
+
+def viewer_state(request):
+    """Подписки зрителя и поколение рекомендаций: от них зависят кнопка
+    подписки, лента подписок и блок «на кого подписаться».
+    """
+    return (
+        follow_graph.following(request.user.pk).tobytes(),
+        suggestions.generation(),
+    )
+
+
+def author_etag(request, username, post_id=None, form=False):
+    # Число подписчиков автора может совпасть и после того, как зритель
+    # подписался, а кто-то отписался, поэтому подписки зрителя — отдельно.
+    settle()
+    return validator(
+        request, username, post_id, author_stats(username),
+        *viewer_state(request), form and csrf_secret(request)
+    )
+
+
+def csrf_secret(request):
+    """Значение CSRF-cookie зрителя, для которого страница выводит форму.
+
+    Токен в форме годится только с тем секретом, с которым она
+    отрендерена: после смены cookie страница из кэша браузера по 304
+    отправила бы форму, которую отклонит CsrfViewMiddleware.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return request.META.get('CSRF_COOKIE')
+
+
+def post_etag(request, username, post_id):
+    """Страница поста: у вошедшего зрителя на ней форма комментария."""
+    return author_etag(request, username, post_id, form=True)
+
+
+def follow_etag(request):
+    settle()
+    return validator(request, *viewer_state(request))
+
+
+def feed_last_modified(request, slug=None):
+    """Last-Modified только для гостей: страница зрителя зависит от него,
+    а запрос с одним If-Modified-Since этого не различит.
+    """
+    if request.user.is_authenticated:
+        return None
+    return feed_cache.changed_at()
@@ -0,0 +1,34 @@
+import datetime
+import time
+
+from django.core.cache import cache
+
+GENERATION_KEY = 'posts:feed-generation'
+
+
+def generation(key=GENERATION_KEY):
+    """Текущее поколение ленты, часть ключа кэша её страниц."""
+    value = cache.get(key)
+    if value is None:
+        # После вытеснения счётчик начинается с текущего времени в мс,
+        # чтобы не совпасть ни с одним из уже выданных поколений.
+        cache.add(key, int(time.time() * 1000), None)
+        value = cache.get(key)
+    return value
+
+
+def bump(key=GENERATION_KEY):
+    """Сдвигает поколение: все закэшированные страницы ленты устаревают."""
+    cache.set(f'{key}:changed', time.time(), None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return generation(key)
+
+
+def changed_at(key=GENERATION_KEY):
+    """Время последнего сдвига поколения или None, если оно неизвестно."""
+    value = cache.get(f'{key}:changed')
+    if value is None:
+        return None
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
@@ -0,0 +1,58 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow
+
+# Подписки пользователя — отсортированный массив 64-битных id авторов.
+# В общем кэше он лежит байтами: 8 байт на подписку вместо списка
+# объектов int, и все процессы читают одну и ту же запись.
+TYPECODE = 'q'
+
+
+def key(user_id):
+    return f'posts:following:{user_id}'
+
+
+def following(user_id):
+    """Отсортированный массив id авторов, на которых подписан пользователь.
+    """
+    ids = array(TYPECODE)
+    if user_id is None:
+        return ids
+    data = cache.get(key(user_id))
+    if data is not None:
+        ids.frombytes(data)
+        return ids
+    # Подписки меняет только сам пользователь, а его запросы после записи
+    # и так идут в основную базу, поэтому чтение с реплики здесь безопасно.
+    ids.extend(
+        Follow.objects.filter(user_id=user_id).order_by(
+            'author_id'
+        ).values_list('author_id', flat=True)
+    )
+    cache.set(key(user_id), ids.tobytes(), settings.FOLLOW_GRAPH_TIMEOUT)
+    return ids
+
+
+def contains(ids, author_id):
+    position = bisect_left(ids, author_id)
+    return position < len(ids) and ids[position] == author_id
+
+
+def is_following(user_id, author_id):
+    return contains(following(user_id), author_id)
+
+
+def followed(user_id, author_ids):
+    """Кого из author_ids читает пользователь: одно чтение кэша на всю
+    страницу авторов.
+    """
+    ids = following(user_id)
+    return {author_id for author_id in author_ids if contains(ids, author_id)}
+
+
+def invalidate(user_id):
+    cache.delete(key(user_id))
@@ -1,6 +1,9 @@
+from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm, Textarea
 
-from .models import Comment, Post
+from . import images, search
+from .models import Comment, Group, Post, User
 
 
 class PostForm(ModelForm):
@@ -14,6 +17,12 @@ class PostForm(ModelForm):
             'image': 'Загрузить изображение',
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return images.normalize(image)
+        return image
+
 
 class CommentForm(ModelForm):
     """Форма для создания комментариев."""
@@ -26,3 +35,27 @@ class CommentForm(ModelForm):
         widgets = {
             'text': Textarea(attrs={'rows': 5}),
         }
+
+
+class SearchForm(forms.Form):
+    """Форма поиска по постам."""
+    q = forms.CharField(label='Запрос', max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(),
+        label='Группа',
+        to_field_name='slug',
+        required=False
+    )
+    author = forms.ModelChoiceField(
+        User.objects.all(),
+        label='Автор',
+        to_field_name='username',
+        required=False,
+        widget=forms.TextInput
+    )
+
+    def clean_q(self):
+        q = self.cleaned_data['q']
+        if not search.match_query(q):
+            raise forms.ValidationError('В запросе нет ни одного слова.')
+        return q
@@ -0,0 +1,128 @@
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+ORIENTATION = 0x0112
+# Сегменты JPEG с метаданными: APP1 (EXIF, XMP) и комментарий.
+JPEG_METADATA = {0xE1, 0xFE}
+JPEG_SCAN = 0xDA
+PNG_METADATA = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+
+def strip_jpeg(data):
+    """Вырезает сегменты метаданных до начала сжатых данных, не
+    перекодируя пиксели.
+    """
+    output = bytearray(data[:2])
+    position = 2
+    while position + 4 <= len(data) and data[position] == 0xFF:
+        marker = data[position + 1]
+        if marker == JPEG_SCAN:
+            break
+        end = position + 2 + int.from_bytes(
+            data[position + 2:position + 4], 'big'
+        )
+        if marker not in JPEG_METADATA:
+            output += data[position:end]
+        position = end
+    return bytes(output + data[position:])
+
+
+def strip_png(data):
+    """Убирает из PNG чанки с метаданными, остальные копирует как есть."""
+    output = bytearray(data[:8])
+    position = 8
+    while position + 8 <= len(data):
+        end = position + 12 + int.from_bytes(
+            data[position:position + 4], 'big'
+        )
+        if data[position + 4:position + 8] not in PNG_METADATA:
+            output += data[position:end]
+        position = end
+    return bytes(output)
+
+
+def strip_metadata(image, data):
+    """Исходные байты без EXIF или None, если без перекодирования
+    метаданные не убрать.
+    """
+    if image.format == 'JPEG':
+        return strip_jpeg(data)
+    if image.format == 'PNG':
+        return strip_png(data)
+    if 'exif' in image.info or 'xmp' in image.info:
+        return None
+    return data
+
+
+def normalize(upload):
+    """Пережимает загруженную картинку перед сохранением поста.
+
+    JPEG декодируется в режиме draft сразу в уменьшенном масштабе,
+    поворот из EXIF применяется к пикселям, а метаданные отбрасываются
+    при перекодировании в POST_IMAGE_FORMAT. Результат пишется во
+    временный файл, который уходит на диск после
+    FILE_UPLOAD_MAX_MEMORY_SIZE байт. Анимации сохраняются как есть.
+
+    Если картинку не нужно ни уменьшать, ни поворачивать, а перекодирование
+    её не сжало, остаётся исходный файл — только без метаданных.
+    """
+    limit = settings.POST_IMAGE_MAX_SIZE
+    before = upload.size
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        if getattr(image, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        original = image
+        untouched = (
+            max(image.size) <= limit
+            and image.getexif().get(ORIENTATION, 1) == 1
+        )
+        image.draft('RGB', (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать изображение.', code='invalid_image'
+        )
+    transparent = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+    image = image.convert('RGBA' if transparent else 'RGB')
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    )
+    image_format = settings.POST_IMAGE_FORMAT
+    image.save(
+        output, image_format, quality=settings.POST_IMAGE_QUALITY,
+        optimize=True
+    )
+    after = output.tell()
+    output.seek(0)
+    stem, extension = os.path.splitext(os.path.basename(upload.name))
+    if untouched and after >= before:
+        upload.seek(0)
+        data = strip_metadata(original, upload.read())
+        if data is not None:
+            logger.info(
+                'Картинка %s: перекодирование не сжимает её (%s -> %s байт), '
+                'сохранён исходный файл без метаданных',
+                upload.name, before, after
+            )
+            return File(ContentFile(data), name=f'{stem}{extension}')
+    logger.info(
+        'Картинка %s: %s -> %s байт, %sx%s, сэкономлено %s байт',
+        upload.name, before, after, image.width, image.height, before - after
+    )
+    return File(output, name=f'{stem}.{EXTENSIONS[image_format]}')
@@ -0,0 +1,160 @@
+import json
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+def generate_batch(batch):
+    """Создаёт миниатюры порции пар (pk, картинка) в дочернем процессе
+    и возвращает число обработанных и пары, которые не удалось.
+    """
+    failed = []
+    for pk, name in batch:
+        try:
+            thumbnails.generate(name)
+        except Exception:
+            failed.append((pk, name))
+    return len(batch), failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт все размеры миниатюр для уже загруженных картинок постов '
+        'в пуле процессов. Прогресс и посты с ошибкой пишутся в файл '
+        'состояния: повторный запуск сначала пробует ошибочные снова, '
+        'а потом продолжает с последней полностью обработанной порции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--state', default='backfill_thumbnails.json')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не читая файл состояния.'
+        )
+
+    def handle(self, *args, **options):
+        self.state = options['state']
+        self.last, self.failed = None, set()
+        if not options['restart']:
+            self.load_state()
+        processes = options['processes']
+        batches = self.batches(options['batch_size'])
+        if processes <= 1:
+            done, failed = self.run_inline(batches)
+        else:
+            done, failed = self.run_pool(batches, processes)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, с ошибкой: {failed}'
+        ))
+
+    def run_inline(self, batches):
+        done = failed = 0
+        for last, batch in batches:
+            count, errors = generate_batch(batch)
+            done, failed = self.report(
+                last, batch, count, errors, done, failed
+            )
+        return done, failed
+
+    def run_pool(self, batches, processes):
+        # spawn, а не fork: дочерний процесс не должен унаследовать
+        # открытое соединение с базой, поэтому Django в нём
+        # настраивается заново.
+        context = multiprocessing.get_context('spawn')
+        done = failed = 0
+        pending = deque()
+        with ProcessPoolExecutor(
+            processes, mp_context=context, initializer=django.setup
+        ) as pool:
+            for last, batch in batches:
+                pending.append(
+                    (last, batch, pool.submit(generate_batch, batch))
+                )
+                while len(pending) >= processes * 2:
+                    wait([future for _, _, future in pending],
+                         return_when=FIRST_COMPLETED)
+                    done, failed = self.advance(pending, done, failed)
+            while pending:
+                wait([future for _, _, future in pending])
+                done, failed = self.advance(pending, done, failed)
+        return done, failed
+
+    def batches(self, size):
+        """Пары (pk для файла состояния, порция): сначала посты, которые
+        в прошлый раз не удалось обработать (прогресс они не сдвигают),
+        потом все после сохранённого pk.
+        """
+        posts = Post.objects.exclude(image='').exclude(image__isnull=True)
+        retry = sorted(self.failed)
+        for start in range(0, len(retry), size):
+            batch = list(posts.filter(
+                pk__in=retry[start:start + size]
+            ).order_by('pk').values_list('pk', 'image'))
+            if batch:
+                yield None, batch
+        last = self.last
+        while True:
+            page = posts.order_by('pk')
+            if last is not None:
+                page = page.filter(pk__gt=last)
+            batch = list(page.values_list('pk', 'image')[:size])
+            if not batch:
+                return
+            last = batch[-1][0]
+            yield last, batch
+
+    def advance(self, pending, done, failed):
+        """Сдвигает сохранённый прогресс по подряд завершённым порциям.
+
+        Порции завершаются в любом порядке, а в файл пишется pk, до
+        которого готово всё, поэтому после сбоя ничего не теряется.
+        """
+        while pending and pending[0][2].done():
+            last, batch, future = pending.popleft()
+            done, failed = self.report(
+                last, batch, *future.result(), done, failed
+            )
+        return done, failed
+
+    def report(self, last, batch, count, errors, done, failed):
+        """Сохраняет прогресс порции; посты с ошибкой остаются в файле
+        состояния, чтобы следующий запуск попробовал их снова.
+        """
+        self.failed.difference_update(pk for pk, _ in batch)
+        for pk, name in errors:
+            self.stderr.write(f'Не удалось обработать {name}')
+            self.failed.add(pk)
+        if last is not None:
+            self.last = last
+        self.save_state()
+        done += count
+        self.stdout.write(f'Обработано картинок: {done}')
+        return done, failed + len(errors)
+
+    def load_state(self):
+        try:
+            with open(self.state, encoding='utf-8') as state:
+                data = json.load(state)
+        except FileNotFoundError:
+            return
+        self.last = data['last_pk']
+        self.failed = set(data.get('failed', ()))
+
+    def save_state(self):
+        temporary = f'{self.state}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as state:
+            json.dump(
+                {'last_pk': self.last, 'failed': sorted(self.failed)}, state
+            )
+        os.replace(temporary, self.state)
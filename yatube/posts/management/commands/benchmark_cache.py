@@ -0,0 +1,91 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from yatube.cache import SQLiteCache
+
+COUNTER_KEY = 'benchmark:counter'
+
+
+def backends(directory, max_entries):
+    params = {'OPTIONS': {'MAX_ENTRIES': max_entries}}
+    return {
+        'locmem': lambda: LocMemCache('benchmark', params),
+        'filebased': lambda: FileBasedCache(
+            os.path.join(directory, 'files'), params
+        ),
+        'sqlite': lambda: SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), params
+        ),
+    }
+
+
+def increment(factory, times):
+    cache = factory()
+    for _ in range(times):
+        cache.incr(COUNTER_KEY)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша: операций в секунду для get/set/incr в '
+        'одном процессе и итог счётчика после incr из нескольких '
+        'процессов (видят ли процессы записи друг друга).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        operations = options['operations']
+        processes = options['processes']
+        # fork: фабрики бэкендов — замыкания, spawn их не передаст.
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for name, factory in backends(directory, operations * 2).items():
+                cache = factory()
+                cache.clear()
+                timings = self.throughput(cache, operations)
+                cache.set(COUNTER_KEY, 0, None)
+                workers = [
+                    context.Process(
+                        target=increment, args=(factory, operations // 10)
+                    )
+                    for _ in range(processes)
+                ]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                expected = processes * (operations // 10)
+                self.stdout.write(
+                    f'{name:<10}'
+                    + ''.join(
+                        f'{op} {rate:9.0f}/с  ' for op, rate in timings
+                    )
+                    + f'счётчик {cache.get(COUNTER_KEY)} из {expected}'
+                )
+
+    def throughput(self, cache, operations):
+        keys = [f'benchmark:{number}' for number in range(operations)]
+        timings = []
+        started = time.perf_counter()
+        for key in keys:
+            cache.set(key, key * 10)
+        timings.append(('set', operations / (time.perf_counter() - started)))
+        started = time.perf_counter()
+        for key in keys:
+            cache.get(key)
+        timings.append(('get', operations / (time.perf_counter() - started)))
+        cache.set(COUNTER_KEY, 0)
+        started = time.perf_counter()
+        for _ in range(operations):
+            cache.incr(COUNTER_KEY)
+        timings.append(('incr', operations / (time.perf_counter() - started)))
+        return timings
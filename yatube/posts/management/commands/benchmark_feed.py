@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+from posts.timeline import follow_page
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает раскладку ленты при записи (push) и чтение при показе '
+        '(pull): строк ленты на пост, время записи и чтения. Все данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=2000)
+        parser.add_argument('--authors', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--reads', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            reader, star = self.populate(options)
+            self.stdout.write(
+                f'{"режим":<6}{"строк/пост":>12}{"запись, мс":>12}'
+                f'{"чтение p50, мс":>16}{"запросов":>10}'
+            )
+            for mode in ('push', 'pull'):
+                UserStats.objects.filter(user=star).update(
+                    pulled=mode == 'pull'
+                )
+                rows, write = self.write(star, options['posts'])
+                read, queries = self.read(reader, options['reads'])
+                self.stdout.write(
+                    f'{mode:<6}{rows:>12.1f}{write:>12.2f}'
+                    f'{read:>16.2f}{queries:>10}'
+                )
+            transaction.set_rollback(True)
+
+    def populate(self, options):
+        prefix = f'bench-feed-{time.monotonic_ns()}'
+        total = 1 + options['followers'] + options['authors']
+        User.objects.bulk_create(
+            User(username=f'{prefix}-{number}') for number in range(total)
+        )
+        users = list(
+            User.objects.filter(username__startswith=prefix).order_by('pk')
+        )
+        UserStats.objects.bulk_create(UserStats(user=user) for user in users)
+        star = users[0]
+        reader = users[1]
+        followers = users[1:options['followers'] + 1]
+        authors = users[options['followers'] + 1:]
+        Follow.objects.bulk_create(
+            [Follow(user=user, author=star) for user in followers]
+            + [Follow(user=reader, author=author) for author in authors]
+        )
+        UserStats.objects.filter(user=star).update(
+            followers_count=len(followers)
+        )
+        for author in authors:
+            for number in range(options['posts']):
+                Post.objects.create(text=f'{prefix} {number}', author=author)
+        return reader, star
+
+    def write(self, star, posts):
+        before = TimelineEntry.objects.count()
+        started = time.perf_counter()
+        for number in range(posts):
+            Post.objects.create(text=f'bench {number}', author=star)
+        elapsed = time.perf_counter() - started
+        rows = (TimelineEntry.objects.count() - before) / posts
+        return rows, elapsed * 1000 / posts
+
+    def read(self, reader, reads):
+        timings = []
+        for _ in range(reads):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                list(follow_page(reader, None))
+                timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000, len(queries)
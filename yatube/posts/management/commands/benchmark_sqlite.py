@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from yatube.sqlite import apply_pragmas
+
+SCHEMA = '''
+CREATE TABLE post (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    comment_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE comment (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    text TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX comment_post ON comment (post_id);
+'''
+POSTS = 1000
+FEED = 'SELECT id, text, comment_count FROM post ORDER BY id DESC LIMIT 10'
+
+
+def profiles():
+    """Настройки соединения: как сейчас и с продакшен-профилем.
+
+    Профиль — (PRAGMA, начало транзакции, держать ли соединение).
+    Без CONN_MAX_AGE Django открывает соединение на каждый запрос.
+    """
+    return {
+        'stock': ({}, 'BEGIN', False),
+        'production': (
+            settings.SQLITE_PRAGMAS, 'BEGIN IMMEDIATE', True
+        ),
+    }
+
+
+def connect(path, pragmas):
+    # Как и Django: autocommit, транзакции открываются явно.
+    db = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(db, pragmas)
+    return db
+
+
+def work(path, profile, writer, seconds):
+    """Пишет комментарии или читает ленту; возвращает (операций, ошибок).
+    """
+    pragmas, begin, persistent = profiles()[profile]
+    db = connect(path, pragmas)
+    done = failed = number = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        number += 1
+        if not persistent:
+            db.close()
+            db = connect(path, pragmas)
+        try:
+            if writer:
+                post_id = number % POSTS + 1
+                db.execute(begin)
+                # Как add_comment: сначала читаем пост, потом пишем.
+                db.execute(
+                    'SELECT id FROM post WHERE id = ?', (post_id,)
+                ).fetchone()
+                db.execute(
+                    'INSERT INTO comment (post_id, text, created) '
+                    'VALUES (?, ?, ?)', (post_id, 'comment', time.time())
+                )
+                db.execute(
+                    'UPDATE post SET comment_count = comment_count + 1 '
+                    'WHERE id = ?', (post_id,)
+                )
+                db.execute('COMMIT')
+            else:
+                db.execute(FEED).fetchall()
+            done += 1
+        except sqlite3.OperationalError:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            failed += 1
+    db.close()
+    return done, failed
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает файл SQLite параллельными записями комментариев и '
+        'чтениями ленты и сравнивает пропускную способность и число '
+        'ошибок «database is locked» без настроек и с SQLITE_PRAGMAS, '
+        'BEGIN IMMEDIATE и постоянными соединениями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=3.0)
+
+    def handle(self, *args, **options):
+        writers, readers = options['writers'], options['readers']
+        seconds = options['seconds']
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for profile, (pragmas, _, _) in profiles().items():
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                db = connect(path, pragmas)
+                db.executescript(SCHEMA)
+                db.executemany(
+                    'INSERT INTO post (text) VALUES (?)',
+                    [('post',)] * POSTS
+                )
+                db.close()
+                roles = [True] * writers + [False] * readers
+                with ProcessPoolExecutor(
+                    len(roles), mp_context=context
+                ) as pool:
+                    results = list(pool.map(
+                        work, [path] * len(roles), [profile] * len(roles),
+                        roles, [seconds] * len(roles)
+                    ))
+                written = sum(done for done, _ in results[:writers])
+                read = sum(done for done, _ in results[writers:])
+                failed = sum(errors for _, errors in results)
+                self.stdout.write(
+                    f'{profile:<11}записей {written / seconds:8.0f}/с  '
+                    f'чтений {read / seconds:8.0f}/с  '
+                    f'ошибок блокировки {failed}'
+                )
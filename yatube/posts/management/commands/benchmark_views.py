@@ -0,0 +1,176 @@
+import json
+import math
+import platform
+import random
+import re
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post
+from yatube.middleware import count_queries
+
+User = get_user_model()
+
+VIEWS = ('index', 'group_posts', 'profile', 'post', 'follow_index')
+
+
+# Ссылка «Следующая» из includes/paginator.html. Курсор берётся из
+# разметки: response.context заполняется только в тестовом окружении.
+NEXT_LINK = re.compile(r'cursor=([\w-]+)">Следующая')
+
+
+def next_cursor(response):
+    match = NEXT_LINK.search(response.content.decode())
+    return match and match.group(1)
+
+
+def percentile(values, share):
+    """Процентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(share * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет p50/p95/p99 времени ответа и число SQL-запросов для '
+        'лент и страницы поста через тестовый клиент Django и пишет '
+        'результат в JSON для сравнения прогонов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--depth', type=int, default=1,
+            help='Сколько страниц ленты пролистывать курсором за замер.'
+        )
+        parser.add_argument('--views', nargs='+', default=VIEWS)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear-cache', action='store_true',
+            help='Очищать кэш перед каждым запросом, чтобы мерить холодные '
+                 'страницы. Кэш общий: не включайте на работающем сайте.'
+        )
+        parser.add_argument('--output', default='benchmark.json')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.options = options
+        results = {}
+        for view in options['views']:
+            targets = getattr(self, f'targets_{view}')()
+            if not targets:
+                self.stderr.write(f'{view}: нет данных, пропускаю')
+                continue
+            results[view] = self.measure(targets)
+            row = results[view]
+            self.stdout.write(
+                f'{view:<14}p50 {row["p50_ms"]:8.2f}  '
+                f'p95 {row["p95_ms"]:8.2f}  p99 {row["p99_ms"]:8.2f} мс  '
+                f'запросов {row["queries_max"]}'
+            )
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'options': {
+                key: options[key]
+                for key in ('requests', 'depth', 'seed', 'clear_cache')
+            },
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результат записан в {options["output"]}'
+        ))
+
+    def sample(self, queryset):
+        """Случайные объекты без ORDER BY RANDOM(): по случайной точке pk."""
+        bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            return []
+        return [
+            queryset.filter(
+                pk__gte=self.random.randint(bounds['low'], bounds['high'])
+            ).order_by('pk').first()
+            for _ in range(self.options['requests'])
+        ]
+
+    def targets_index(self):
+        return [(None, reverse('index'))] * self.options['requests']
+
+    def targets_group_posts(self):
+        return [
+            (None, reverse('group_posts', args=[group.slug]))
+            for group in self.sample(Group.objects.all())
+        ]
+
+    def targets_profile(self):
+        return [
+            (None, reverse('profile', args=[author.username]))
+            for author in self.sample(
+                User.objects.filter(stats__posts_count__gt=0)
+            )
+        ]
+
+    def targets_post(self):
+        return [
+            (None, reverse('post', args=[post.author.username, post.pk]))
+            for post in self.sample(Post.objects.select_related('author'))
+        ]
+
+    def targets_follow_index(self):
+        return [
+            (reader, reverse('follow_index'))
+            for reader in self.sample(
+                User.objects.filter(stats__following_count__gt=0)
+            )
+        ]
+
+    def measure(self, targets):
+        timings = []
+        queries = []
+        clients = {}
+        for user, url in targets:
+            client = clients.get(user)
+            if client is None:
+                client = clients[user] = Client()
+                if user is not None:
+                    client.force_login(user)
+            cursor = None
+            for _ in range(self.options['depth']):
+                if self.options['clear_cache']:
+                    cache.clear()
+                data = {'cursor': cursor} if cursor else {}
+                with count_queries() as counter:
+                    started = time.perf_counter()
+                    response = client.get(url, data)
+                    timings.append(time.perf_counter() - started)
+                queries.append(counter.count)
+                cursor = next_cursor(response)
+                if cursor is None:
+                    break
+        return {
+            'requests': len(timings),
+            'p50_ms': percentile(timings, 0.50) * 1000,
+            'p95_ms': percentile(timings, 0.95) * 1000,
+            'p99_ms': percentile(timings, 0.99) * 1000,
+            'queries_avg': sum(queries) / len(queries),
+            'queries_max': max(queries),
+            'max_page': settings.MAX_PAGE,
+        }
@@ -0,0 +1,99 @@
+import datetime
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post
+
+# Модель -> (поле в JSONL -> путь для values_list). Связи пишутся
+# естественными ключами: пользователь — username, группа — slug, пост —
+# автор и дата публикации; id этой базы в выгрузку не попадают.
+# Порядок словаря — порядок зависимостей при загрузке.
+FORMATS = {
+    'posts.group': (Group, {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    'posts.post': (Post, {
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    }),
+    'posts.comment': (Comment, {
+        'post_author': 'post__author__username',
+        'post_pub_date': 'post__pub_date',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'posts.follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder обрезает время до миллисекунд, а выгрузка
+    должна сохранять даты точно.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в JSONL: одна '
+        'строка на запись, строки читаются из базы порциями и сразу '
+        'пишутся в файл. Загружается командой import_jsonl.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--models', nargs='+', choices=list(FORMATS),
+            default=list(FORMATS)
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options)
+            return
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            self.export(output, options)
+
+    def export(self, output, options):
+        encoder = ExportEncoder(ensure_ascii=False)
+        for label in FORMATS:
+            if label not in options['models']:
+                continue
+            model, fields = FORMATS[label]
+            rows = model.objects.order_by('pk').values_list(*fields.values())
+            started = time.perf_counter()
+            count = 0
+            for row in rows.iterator(chunk_size=options['batch_size']):
+                record = {'model': label, **dict(zip(fields, row))}
+                output.write(encoder.encode(record))
+                output.write('\n')
+                count += 1
+            self.stderr.write(self.rate(label, count, started))
+
+    @staticmethod
+    def rate(label, count, started):
+        elapsed = time.perf_counter() - started
+        return (
+            f'{label}: {count} строк за {elapsed:.1f} с, '
+            f'{count / elapsed if elapsed else 0:.0f} строк/с'
+        )
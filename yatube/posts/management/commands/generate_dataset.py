@@ -0,0 +1,244 @@
+import datetime
+import heapq
+import itertools
+import random
+import time
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts import autocomplete, feed_cache
+from posts.bulk import batched, explicit_dates
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry,
+                          UserStats)
+
+User = get_user_model()
+
+PARETO_SHAPE = 1.5
+WORDS = (
+    'зима близко север юг дракон ворон письмо замок пир меч щит '
+    'река лес море корабль король королева рыцарь стена ночь день'
+).split()
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса степенного распределения для random.choices."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет настроенную базу воспроизводимым синтетическим набором: '
+        'пользователи, группы, посты, комментарии и граф подписок со '
+        'степенным распределением популярности авторов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=2_000_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок на пользователя.'
+        )
+        parser.add_argument('--exponent', type=float, default=1.1)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = datetime.timedelta(days=options['days']).total_seconds()
+        self.prefix = f'synthetic-{options["seed"]}'
+        started = time.perf_counter()
+        user_ids = self.step('Пользователи', self.create_users, options)
+        group_ids = self.step('Группы', self.create_groups, options)
+        weights = zipf_weights(len(user_ids), options['exponent'])
+        popular = user_ids[:]
+        self.random.shuffle(popular)
+        post_ids = self.step(
+            'Посты', self.create_posts, options, popular, weights, group_ids
+        )
+        self.step(
+            'Комментарии', self.create_comments, options, user_ids, post_ids
+        )
+        self.step(
+            'Подписки', self.create_follows, options, user_ids, popular,
+            weights
+        )
+        self.step('Счётчики', self.fill_counters)
+        self.step('Ленты подписок', self.fill_timelines, user_ids)
+        # bulk_create не шлёт сигналов: индексы в процессах сайта
+        # перечитают базу по новому поколению.
+        feed_cache.bump()
+        feed_cache.bump(autocomplete.GENERATION_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def step(self, title, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f'{title}: {time.perf_counter() - started:.1f} с')
+        return result
+
+    def moment(self):
+        return self.now - datetime.timedelta(
+            seconds=self.random.random() * self.span
+        )
+
+    def text(self, low, high):
+        return ' '.join(self.random.choices(
+            WORDS, k=self.random.randint(low, high)
+        ))
+
+    @transaction.atomic
+    def insert(self, model, objects):
+        for batch in batched(objects, self.batch_size):
+            model.objects.bulk_create(batch)
+
+    def create_users(self, options):
+        users = (
+            User(
+                username=f'{self.prefix}-{number}',
+                first_name=self.random.choice(WORDS).title(),
+                password='!',
+            )
+            for number in range(options['users'])
+        )
+        self.insert(User, users)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{self.prefix}-'
+        ).order_by('pk').values_list('pk', flat=True))
+        self.insert(UserStats, (UserStats(user_id=pk) for pk in user_ids))
+        return user_ids
+
+    def create_groups(self, options):
+        groups = (
+            Group(
+                title=f'{self.text(1, 3)} {number}',
+                slug=f'{self.prefix}-{number}',
+                description=self.text(5, 20),
+            )
+            for number in range(options['groups'])
+        )
+        self.insert(Group, groups)
+        return list(Group.objects.filter(
+            slug__startswith=f'{self.prefix}-'
+        ).values_list('pk', flat=True))
+
+    def create_posts(self, options, popular, weights, group_ids):
+        def posts():
+            for _ in range(options['posts']):
+                group = self.random.random() < 0.6
+                yield Post(
+                    text=self.text(5, 80),
+                    author_id=self.random.choices(
+                        popular, cum_weights=weights
+                    )[0],
+                    group_id=self.random.choice(group_ids) if group else None,
+                    pub_date=self.moment(),
+                )
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.insert(Post, posts())
+        return list(Post.objects.filter(
+            author_id__in=User.objects.filter(
+                username__startswith=f'{self.prefix}-'
+            )
+        ).values_list('pk', flat=True))
+
+    def create_comments(self, options, user_ids, post_ids):
+        post_weights = zipf_weights(len(post_ids), options['exponent'])
+        comments = (
+            Comment(
+                post_id=self.random.choices(
+                    post_ids, cum_weights=post_weights
+                )[0],
+                author_id=self.random.choice(user_ids),
+                text=self.text(2, 30),
+                created=self.moment(),
+            )
+            for _ in range(options['comments'])
+        )
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, comments)
+
+    def create_follows(self, options, user_ids, popular, weights):
+        # Среднее paretovariate(a) равно a / (a - 1), отсюда масштаб.
+        scale = options['follows'] * (PARETO_SHAPE - 1) / PARETO_SHAPE
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(
+                    int(self.random.paretovariate(PARETO_SHAPE) * scale),
+                    len(popular) - 1,
+                )
+                authors = set(self.random.choices(
+                    popular, cum_weights=weights, k=wanted
+                ))
+                authors.discard(user_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+        self.insert(Follow, follows())
+
+    def fill_counters(self):
+        call_command(
+            'reconcile_counters', chunk_size=self.batch_size,
+            stdout=self.stdout
+        )
+
+    def fill_timelines(self, user_ids):
+        """Раскладывает по лентам новых пользователей последние
+        FOLLOW_TIMELINE_LENGTH постов их авторов, как это сделал бы
+        fan-out при записи.
+        """
+        length = settings.FOLLOW_TIMELINE_LENGTH
+        pushed = set(UserStats.objects.filter(
+            pulled=False
+        ).values_list('user_id', flat=True).iterator())
+        recent = defaultdict(list)
+        posts = Post.objects.order_by('author_id', '-pub_date', '-id')
+        for author_id, pk, pub_date in posts.values_list(
+            'author_id', 'pk', 'pub_date'
+        ).iterator():
+            if author_id in pushed and len(recent[author_id]) < length:
+                recent[author_id].append((pub_date, pk, author_id))
+        follows = Follow.objects.filter(
+            user_id__gte=user_ids[0], user_id__lte=user_ids[-1]
+        ).order_by('user_id').values_list('user_id', 'author_id')
+
+        def rows():
+            adapt = connection.ops.adapt_datetimefield_value
+            for user_id, follows_of_user in itertools.groupby(
+                follows.iterator(), key=itemgetter(0)
+            ):
+                streams = [
+                    recent[author_id] for _, author_id in follows_of_user
+                ]
+                merged = heapq.merge(*streams, reverse=True)
+                for pub_date, pk, author_id in itertools.islice(
+                    merged, length
+                ):
+                    yield user_id, pk, author_id, adapt(pub_date)
+
+        # Производная таблица в десятки раз больше постов, поэтому строки
+        # идут через executemany без сборки моделей и SQL на каждую порцию.
+        sql = (
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'VALUES (%s, %s, %s, %s)'
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            for batch in batched(rows(), self.batch_size):
+                cursor.executemany(sql, batch)
@@ -0,0 +1,242 @@
+import itertools
+import json
+import sys
+import time
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from posts import autocomplete, feed_cache, follow_graph, timeline
+from posts.bulk import batched, explicit_dates
+from posts.management.commands.export_jsonl import FORMATS
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает JSONL из export_jsonl порциями через bulk_create. '
+        'Пользователи и группы находятся по username и slug, посты — по '
+        'автору, дате и тексту, пост комментария — по автору и дате, сам '
+        'комментарий — по посту, автору, дате и тексту. Каждая порция '
+        'разрешает свои ключи запросами к базе, поэтому память не растёт '
+        'с размером файла. Уже существующие записи пропускаются, повторная '
+        'загрузка ничего не дублирует. Файлы картинок не переносятся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?', default='-',
+            help='Файл для загрузки, по умолчанию stdin.'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать недостающих пользователей без пароля, '
+                 'а не пропускать их записи.'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.create_users = options['create_users']
+        if options['input'] == '-':
+            self.load(sys.stdin)
+        else:
+            with open(options['input'], encoding='utf-8') as lines:
+                self.load(lines)
+        self.finish()
+
+    def load(self, lines):
+        loaders = {
+            'posts.group': self.load_groups,
+            'posts.post': self.load_posts,
+            'posts.comment': self.load_comments,
+            'posts.follow': self.load_follows,
+        }
+        records = (json.loads(line) for line in lines if line.strip())
+        for label, group in itertools.groupby(
+            records, key=itemgetter('model')
+        ):
+            if label not in FORMATS:
+                raise CommandError(f'Неизвестная модель {label}')
+            started = time.perf_counter()
+            read = skipped = 0
+            for batch in batched(group, self.batch_size):
+                with transaction.atomic():
+                    skipped += len(batch) - loaders[label](batch)
+                read += len(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{label}: прочитано {read}, пропущено {skipped} (уже '
+                    f'есть или нет связанной записи), '
+                    f'{read / elapsed if elapsed else 0:.0f} строк/с'
+                )
+
+    def finish(self):
+        """Делает то, что при построчном сохранении сделали бы сигналы."""
+        call_command('reconcile_counters', stdout=self.stdout)
+        feed_cache.bump()
+        feed_cache.bump(autocomplete.GENERATION_KEY)
+        self.stdout.write(self.style.SUCCESS(
+            'Загрузка завершена. Миниатюры картинок создаёт '
+            'backfill_thumbnails.'
+        ))
+
+    def users(self, usernames):
+        """username -> id для порции; недостающих создаёт по запросу."""
+        found = dict(User.objects.filter(
+            username__in=usernames
+        ).values_list('username', 'pk'))
+        missing = set(usernames) - set(found)
+        if missing and self.create_users:
+            User.objects.bulk_create(
+                User(username=username, password='!')
+                for username in missing
+            )
+            found.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+        return found
+
+    @staticmethod
+    def posts(rows):
+        """(username автора, дата) -> id поста для порции комментариев.
+
+        Ключ без текста: два поста одного автора с одной датой до
+        микросекунды не различаются, комментарий достаётся первому.
+        """
+        found = Post.objects.filter(
+            author__username__in={row['post_author'] for row in rows},
+            pub_date__in={
+                parse_datetime(row['post_pub_date']) for row in rows
+            },
+        ).order_by('-pk').values_list('author__username', 'pub_date', 'pk')
+        return {(username, pub_date): pk for username, pub_date, pk in found}
+
+    def load_groups(self, rows):
+        """Создаёт группы с новыми slug; возвращает число созданных."""
+        rows = {row['slug']: row for row in rows}
+        existing = set(Group.objects.filter(
+            slug__in=rows
+        ).values_list('slug', flat=True))
+        Group.objects.bulk_create(
+            (Group(**{
+                name: row[name] for name in ('slug', 'title', 'description')
+            }) for slug, row in rows.items() if slug not in existing),
+            ignore_conflicts=True
+        )
+        return len(rows) - len(existing)
+
+    def load_posts(self, rows):
+        """Создаёт посты без id из файла: он может быть занят в этой базе
+        другим постом. Свой id пост получает по естественному ключу.
+        """
+        users = self.users({row['author'] for row in rows})
+        groups = dict(Group.objects.filter(
+            slug__in={row['group'] for row in rows if row['group']}
+        ).values_list('slug', 'pk'))
+        posts = {}
+        for row in rows:
+            if row['author'] not in users:
+                continue
+            post = Post(
+                text=row['text'],
+                pub_date=parse_datetime(row['pub_date']),
+                author_id=users[row['author']],
+                group_id=groups.get(row['group']),
+                image=row['image'] or '',
+            )
+            posts.setdefault(post_key(post), post)
+        found = post_ids(posts)
+        created = [post for key, post in posts.items() if key not in found]
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            Post.objects.bulk_create(created)
+        found.update(post_ids(posts))
+        for key, post in posts.items():
+            post.pk = found[key]
+        # Подписки, уже лежащие в базе, сигналы раскладывать не будут.
+        timeline.fan_out_many(created)
+        return len(created)
+
+    def load_comments(self, rows):
+        if rows and 'post_author' not in rows[0]:
+            raise CommandError(
+                'Комментарии выгружены без ключа поста: повторите выгрузку '
+                'командой export_jsonl этой версии.'
+            )
+        users = self.users({row['author'] for row in rows})
+        posts = self.posts(rows)
+        comments = {}
+        for row in rows:
+            post_id = posts.get(
+                (row['post_author'], parse_datetime(row['post_pub_date']))
+            )
+            if row['author'] not in users or post_id is None:
+                continue
+            comment = Comment(
+                post_id=post_id,
+                author_id=users[row['author']],
+                text=row['text'],
+                created=parse_datetime(row['created']),
+            )
+            comments.setdefault(comment_key(comment), comment)
+        existing = Comment.objects.filter(
+            post_id__in={comment.post_id for comment in comments.values()},
+            created__in={comment.created for comment in comments.values()},
+        ).values_list('post_id', 'author_id', 'created', 'text')
+        for key in existing:
+            comments.pop(key, None)
+        with explicit_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(comments.values())
+        return len(comments)
+
+    def load_follows(self, rows):
+        users = self.users(
+            {row['user'] for row in rows} | {row['author'] for row in rows}
+        )
+        pairs = {
+            (users[row['user']], users[row['author']])
+            for row in rows
+            if row['user'] in users and row['author'] in users
+        }
+        pairs -= set(Follow.objects.filter(
+            user_id__in={user for user, _ in pairs},
+            author_id__in={author for _, author in pairs},
+        ).values_list('user_id', 'author_id'))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author) for user, author in pairs),
+            ignore_conflicts=True
+        )
+        # Посты уже загружены: раскладываем их по лентам новых подписок.
+        for user, author in pairs:
+            timeline.backfill(user, author)
+        # bulk_create не шлёт сигналов: подписки в кэше сбрасываем сами.
+        for user in {user for user, _ in pairs}:
+            follow_graph.invalidate(user)
+        return len(pairs)
+
+
+def post_key(post):
+    return post.author_id, post.pub_date, post.text
+
+
+def comment_key(comment):
+    return comment.post_id, comment.author_id, comment.created, comment.text
+
+
+def post_ids(posts):
+    """Естественный ключ -> id для постов порции, которые уже в базе."""
+    found = Post.objects.filter(
+        author_id__in={key[0] for key in posts},
+        pub_date__in={key[1] for key in posts},
+    ).values_list('author_id', 'pub_date', 'text', 'pk')
+    return {
+        (author_id, pub_date, text): pk
+        for author_id, pub_date, text, pk in found
+        if (author_id, pub_date, text) in posts
+    }
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+from posts.management.commands.reconcile_counters import chunks
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов порциями по pk. '
+        'Новые записи индексируют триггеры; запускать, когда индекс '
+        'разошёлся с постами, лучше без параллельной правки текстов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        search.install_triggers()
+        table = search.TABLE
+        last = Post.objects.order_by('-pk').values_list('pk', flat=True)
+        last = last.first()
+        command = f'INSERT INTO {table} ({table}) VALUES (%s)'
+        with connection.cursor() as cursor:
+            cursor.execute(command, ['delete-all'])
+        indexed = 0
+        if last is not None:
+            for ids in chunks(Post.objects.filter(pk__lte=last),
+                              options['batch_size']):
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f'INSERT INTO {table} (rowid, text) '
+                        f'SELECT id, text FROM posts_post '
+                        f'WHERE id BETWEEN %s AND %s',
+                        [ids[0], ids[-1]]
+                    )
+                indexed += len(ids)
+                self.stdout.write(f'Проиндексировано постов: {indexed}')
+        with connection.cursor() as cursor:
+            cursor.execute(command, ['optimize'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс перестроен, постов: {indexed}'
+        ))
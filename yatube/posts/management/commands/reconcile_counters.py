@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import timeline
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+def chunks(queryset, size):
+    """Отдаёт первичные ключи порциями, листая по pk без OFFSET."""
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        ids = list(page.values_list('pk', flat=True)[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+def needs_switch(stats):
+    """Пересёк ли исправленный счётчик подписчиков порог режима ленты."""
+    if stats.pulled:
+        return stats.followers_count < settings.FOLLOW_PUSH_THRESHOLD
+    return stats.followers_count >= settings.FOLLOW_PULL_THRESHOLD
+
+
+def totals(model, field, ids):
+    rows = model.objects.filter(**{f'{field}__in': ids}).order_by()
+    return dict(rows.values_list(field).annotate(total=Count('pk')))
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и профилей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        size = options['chunk_size']
+        posts = sum(
+            self.reconcile_posts(ids) for ids in chunks(Post.objects, size)
+        )
+        users = sum(
+            self.reconcile_users(ids) for ids in chunks(User.objects, size)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено постов: {posts}, профилей: {users}'
+        ))
+
+    @transaction.atomic
+    def reconcile_posts(self, ids):
+        comments = totals(Comment, 'post', ids)
+        drifted = []
+        for post in Post.objects.filter(pk__in=ids).only('comment_count'):
+            actual = comments.get(post.pk, 0)
+            if post.comment_count != actual:
+                post.comment_count = actual
+                drifted.append(post)
+        Post.objects.bulk_update(drifted, ['comment_count'])
+        return len(drifted)
+
+    @transaction.atomic
+    def reconcile_users(self, ids):
+        actual = {
+            'posts_count': totals(Post, 'author', ids),
+            'followers_count': totals(Follow, 'author', ids),
+            'following_count': totals(Follow, 'user', ids),
+        }
+        stats = UserStats.objects.in_bulk(ids)
+        missing = [UserStats(user_id=pk) for pk in ids if pk not in stats]
+        UserStats.objects.bulk_create(missing)
+        stats.update((row.user_id, row) for row in missing)
+        drifted = []
+        for pk, row in stats.items():
+            changed = False
+            for name, counts in actual.items():
+                if getattr(row, name) != counts.get(pk, 0):
+                    setattr(row, name, counts.get(pk, 0))
+                    changed = True
+            if changed:
+                drifted.append(row)
+        UserStats.objects.bulk_update(drifted, list(actual))
+        for row in drifted:
+            if needs_switch(row):
+                timeline.update_mode(row.user_id)
+        return len(drifted)
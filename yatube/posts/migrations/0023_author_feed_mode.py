@@ -0,0 +1,39 @@
+# Generated by Django 2.2.6 on 2026-10-18 19:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_modes(apps, schema_editor):
+    # До этой миграции режим выбирался по числу подписчиков на каждом
+    # запросе: фиксируем его, а разложенные копии постов авторов, которых
+    # теперь читают при показе, убираем.
+    UserStats = apps.get_model('posts', 'UserStats')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    pulled = UserStats.objects.filter(
+        followers_count__gte=settings.FOLLOW_PULL_THRESHOLD
+    )
+    pulled.update(pulled=True)
+    TimelineEntry.objects.filter(
+        author_id__in=pulled.values('user_id')
+    ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_suggestion'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ('-pub_date', '-post_id')},
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='pulled',
+            field=models.BooleanField(default=False, verbose_name='Читается при показе'),
+        ),
+        migrations.RunPython(record_modes, migrations.RunPython.noop),
+    ]
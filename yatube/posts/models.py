@@ -27,7 +27,8 @@ class Post(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='posts'
+        related_name='posts',
+        db_index=False
     )
     group = models.ForeignKey(
         Group,
@@ -35,13 +36,19 @@ class Post(models.Model):
         on_delete=models.SET_NULL,
         related_name='posts',
         blank=True,
-        null=True
+        null=True,
+        db_index=False
     )
     image = models.ImageField(
         'Изображение',
         upload_to='posts/',
         blank=True, null=True
     )
+    comment_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.text[:15]
@@ -50,6 +57,14 @@ class Post(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты автора и группы читаются по индексу в порядке вывода,
+        # без сортировки; отдельные индексы внешних ключей не нужны.
+        indexes = (
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_pub_date'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_pub_date'),
+        )
 
 
 class Comment(models.Model):
@@ -58,6 +73,7 @@ class Comment(models.Model):
         Post,
         on_delete=models.CASCADE,
         related_name='comments',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
@@ -68,6 +84,12 @@ class Comment(models.Model):
     text = models.TextField(verbose_name='Текст')
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created'),
+        )
+
     def __str__(self):
         return self.text
 
@@ -78,17 +100,143 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик',
+        db_index=False
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
-        verbose_name='Избранный автор'
+        verbose_name='Избранный автор',
+        db_index=False
     )
 
     class Meta:
+        # Подписки пользователя ищутся по уникальному (user, author),
+        # подписчики автора — по (author, user).
         constraints = (
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_follow'),
         )
+        indexes = (
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user'),
+        )
+
+
+class UserStats(models.Model):
+    """Счётчики профиля, обновляемые вместе с постами и подписками."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Записей', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Посты автора читаются при показе ленты, а не раскладываются
+    # подписчикам; переключает posts.timeline.update_mode.
+    pulled = models.BooleanField('Читается при показе', default=False)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        db_index=False
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post_id')
+        constraints = (
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry'),
+        )
+        indexes = (
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_pub_date'),
+        )
+
+
+class Suggestion(models.Model):
+    """Автор, которого стоит предложить пользователю: результат команды
+    build_suggestions.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        db_index=False
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = (
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_suggestion'),
+        )
+        indexes = (
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score'),
+        )
+
+
+class SearchField(models.TextField):
+    """Столбец полнотекстового индекса FTS5."""
+
+
+@SearchField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class PostSearch(models.Model):
+    """Полнотекстовый индекс FTS5 по тексту постов.
+
+    Таблица виртуальная и без своих данных (content=posts_post): хранит
+    только индекс, текст читается из постов. Синхронизируется триггерами
+    из posts.search, rank — оценка bm25 для текущего запроса MATCH.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search'
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
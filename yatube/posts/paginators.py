@@ -0,0 +1,226 @@
+import base64
+import binascii
+import copy
+import datetime
+import heapq
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    values = [
+        value.isoformat() if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class CursorPaginator(Paginator):
+    """Постраничная навигация по ключу (pub_date, id) без OFFSET и COUNT.
+
+    Страница выбирается условием на ключ последней показанной записи,
+    поэтому время ответа не зависит от глубины листания.
+
+    Записи не считаются: count всегда None. Сам пагинатор состояния не
+    хранит — курсоры next_cursor и previous_cursor лежат на странице, а
+    page.paginator — копия, у которой num_pages считает только окно
+    «предыдущая, текущая, следующая»; у общего пагинатора num_pages и
+    page_range равны None.
+    """
+
+    count = None
+    num_pages = None
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+
+    @property
+    def page_range(self):
+        if self.num_pages is None:
+            return None
+        return range(1, self.num_pages + 1)
+
+    def validate_number(self, number):
+        return number
+
+    def get_page(self, cursor):
+        """Возвращает страницу по токену; битый токен даёт первую страницу."""
+        return self.page(cursor)
+
+    def page(self, cursor):
+        decoded = decode_cursor(cursor)
+        if decoded is not None:
+            decoded = self._parse(*decoded)
+        direction, values = decoded or (NEXT, None)
+        ordering = self.ordering
+        if direction == PREVIOUS:
+            ordering = tuple(self._reverse(field) for field in ordering)
+        rows = self.fetch(ordering, values, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = values is not None, has_more
+        number = 1 + has_previous
+        page = Page(rows, number, self._window(number + has_next))
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = encode_cursor(NEXT, self._key(rows[-1]))
+        if rows and has_previous:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, self._key(rows[0])
+            )
+        return page
+
+    def _window(self, num_pages):
+        window = copy.copy(self)
+        window.num_pages = num_pages
+        return window
+
+    def fetch(self, ordering, values, limit):
+        """Первые limit записей в порядке ordering строго после ключа."""
+        return list(self._slice(self.object_list, ordering, values)[:limit])
+
+    def _slice(self, queryset, ordering, values):
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        return queryset
+
+    @staticmethod
+    def _name(field):
+        return field.lstrip('-')
+
+    @staticmethod
+    def _reverse(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _key(self, obj):
+        names = [self._name(field) for field in self.ordering]
+        if isinstance(obj, dict):
+            return [obj[name] for name in names]
+        return [getattr(obj, name) for name in names]
+
+    def _parse(self, direction, values):
+        if len(values) != len(self.ordering):
+            return None
+        opts = self.object_list.model._meta
+        parsed = []
+        for field, value in zip(self.ordering, values):
+            try:
+                value = opts.get_field(self._name(field)).to_python(value)
+            except FieldDoesNotExist:
+                pass
+            except ValidationError:
+                return None
+            parsed.append(value)
+        return direction, parsed
+
+    def _after(self, ordering, values):
+        """Условие «строго после ключа» для лексикографического порядка.
+
+        Первое поле дополнительно ограничено нестрогим неравенством вне
+        OR: по нему база начинает чтение индекса с позиции курсора, а не
+        с начала ленты.
+        """
+        condition = Q()
+        for index, field in reversed(list(enumerate(ordering))):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            name = self._name(field)
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            if index < len(ordering) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        first = ordering[0]
+        lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{self._name(first)}__{lookup}': values[0]}) & condition
+
+
+class MergedCursorPaginator(CursorPaginator):
+    """Курсорная навигация по нескольким источникам, слитым по ключу.
+
+    Источник — тройка (queryset, ordering, convert): его ordering задаёт
+    тот же ключ под своими именами полей, а convert превращает строку
+    источника в объект модели model. Из каждого источника берётся по
+    странице, потоки сливаются через heapq.merge без повторов.
+    """
+
+    def __init__(self, sources, per_page, model,
+                 ordering=('-pub_date', '-id')):
+        super().__init__(model.objects.none(), per_page, ordering)
+        self.sources = sources
+
+    def fetch(self, ordering, values, limit):
+        """Первые limit разных записей после ключа из всех источников.
+
+        Одна запись может прийти из нескольких источников, поэтому
+        источники дочитываются порциями, пока не наберётся limit разных
+        записей или источники не кончатся.
+        """
+        reverse = ordering[0].startswith('-')
+        rows, seen = [], set()
+        while True:
+            streams, horizon = self._read(ordering, values, limit)
+            merged = heapq.merge(*streams, key=self._key, reverse=reverse)
+            for row in merged:
+                key = tuple(self._key(row))
+                if horizon is not None and key != horizon and (
+                    (key < horizon) == reverse
+                ):
+                    break
+                if key not in seen:
+                    seen.add(key)
+                    rows.append(row)
+                    if len(rows) == limit:
+                        return rows
+            if horizon is None:
+                return rows
+            values = list(horizon)
+
+    def _read(self, ordering, values, limit):
+        """Порция каждого источника и ключ, до которого их можно сливать.
+
+        Дальше последней строки полной порции в её источнике могут быть
+        непрочитанные строки; None — все источники прочитаны до конца.
+        """
+        flip = ordering != self.ordering
+        reverse = ordering[0].startswith('-')
+        streams, horizon = [], None
+        for queryset, source_ordering, convert in self.sources:
+            if flip:
+                source_ordering = tuple(map(self._reverse, source_ordering))
+            batch = [
+                convert(row) for row in
+                self._slice(queryset, source_ordering, values)[:limit]
+            ]
+            streams.append(batch)
+            if len(batch) == limit:
+                last = tuple(self._key(batch[-1]))
+                if horizon is None or (last > horizon) == reverse:
+                    horizon = last
+        return streams, horizon
@@ -0,0 +1,76 @@
+import re
+
+from django.db import connections
+from django.db.models import F
+
+from .models import Post
+
+TABLE = 'posts_post_fts'
+TRIGGERS = {
+    f'{TABLE}_insert': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    ''',
+    f'{TABLE}_delete': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END
+    ''',
+    f'{TABLE}_update': f'''
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {TABLE} ({TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {TABLE} (rowid, text) VALUES (new.id, new.text);
+        END
+    ''',
+}
+
+
+def match_query(text):
+    """Строка запроса FTS5 из пользовательского ввода.
+
+    Каждое слово берётся в кавычки, поэтому операторы и спецсимволы
+    FTS5 во вводе не ломают запрос; слова объединяются через AND.
+    """
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def search_posts(text, group=None, author=None):
+    """Посты по полнотекстовому запросу с рангом bm25 в поле rank."""
+    posts = Post.objects.select_related('author', 'group').filter(
+        search__text__match=match_query(text)
+    ).annotate(rank=F('search__rank'))
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    return posts
+
+
+def install_triggers(using='default'):
+    """Создаёт недостающие триггеры синхронизации индекса с posts_post.
+
+    SQLite удаляет триггеры вместе с таблицей, а миграции пересоздают
+    posts_post при изменении схемы; если триггеров не было, индекс мог
+    отстать и перестраивается целиком.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if TABLE not in connection.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        missing = set(TRIGGERS) - existing
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('rebuild')")
@@ -0,0 +1,123 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import (autocomplete, feed_cache, follow_graph, thumbnails,
+               timeline)
+from .models import Comment, Follow, Group, Post, UserStats
+
+
+def shift(queryset, **deltas):
+    """Сдвигает счётчики одним UPDATE, не опуская их ниже нуля."""
+    return queryset.update(**{
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    })
+
+
+def shift_stats(user_id, **deltas):
+    """Сдвигает счётчики профиля; пропавшие строки чинит reconcile_counters.
+    """
+    return shift(UserStats.objects.filter(user_id=user_id), **deltas)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        shift_stats(instance.author_id, posts_count=1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image:
+        thumbnails.schedule(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    shift_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        shift(Post.objects.filter(pk=instance.post_id), comment_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    shift(Post.objects.filter(pk=instance.post_id), comment_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        shift_stats(instance.author_id, followers_count=1)
+        shift_stats(instance.user_id, following_count=1)
+        timeline.update_mode(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Сбрасываем сразу, чтобы запись видела себя до конца транзакции,
+    # и после фиксации — на случай, если другой процесс успел положить
+    # в кэш подписки без неё.
+    follow_graph.invalidate(instance.user_id)
+    transaction.on_commit(lambda: follow_graph.invalidate(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    shift_stats(instance.author_id, followers_count=-1)
+    shift_stats(instance.user_id, following_count=-1)
+    timeline.update_mode(instance.author_id)
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def feed_changed(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(feed_cache.bump)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_save, sender=Group)
+def autocomplete_saved(sender, instance, created=False, raw=False,
+                       update_fields=None, **kwargs):
+    fields = (
+        autocomplete.GROUP_FIELDS if sender is Group
+        else autocomplete.USER_FIELDS
+    )
+    # Вход пользователя сохраняет только last_login — индекс не трогаем.
+    if raw or update_fields is not None and not fields & set(update_fields):
+        return
+    transaction.on_commit(lambda: autocomplete.changed(instance))
+    if sender is not Group and not created:
+        # Имя автора выводится в карточках постов всех лент.
+        transaction.on_commit(feed_cache.bump)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=Group)
+def autocomplete_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: autocomplete.changed(instance, deleted=True)
+    )
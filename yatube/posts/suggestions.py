@@ -0,0 +1,137 @@
+from array import array
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from . import feed_cache, follow_graph
+from .models import Follow, Suggestion
+
+GENERATION_KEY = 'posts:suggestions-generation'
+# Популярных авторов читают почти все, и общий подписчик такого автора
+# ничего не говорит о сходстве вкусов, а обход его подписчиков дорог.
+MAX_SHARED_FOLLOWERS = 1000
+# Вес автора, которого читает тот, кого читает пользователь, относительно
+# голоса одного похожего читателя.
+FRIENDS_WEIGHT = 0.5
+
+
+def load_matrix(chunk_size=2000):
+    """Подписки как разреженная матрица «пользователь × автор».
+
+    Возвращает массив ids (номер строки и столбца -> id пользователя) и
+    CSR-матрицу из единиц. Таблица читается потоком по индексу
+    (user, author), в памяти — по два int64 на подписку.
+    """
+    users, authors = array(follow_graph.TYPECODE), array(follow_graph.TYPECODE)
+    rows = Follow.objects.order_by('user_id', 'author_id').values_list(
+        'user_id', 'author_id'
+    )
+    for user_id, author_id in rows.iterator(chunk_size=chunk_size):
+        users.append(user_id)
+        authors.append(author_id)
+    pairs = np.concatenate([
+        np.frombuffer(users, dtype=np.int64),
+        np.frombuffer(authors, dtype=np.int64),
+    ])
+    ids, positions = np.unique(pairs, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(users)),
+            (positions[:len(users)], positions[len(users):]),
+        ),
+        shape=(len(ids), len(ids)),
+    )
+    return ids, matrix
+
+
+def inverse(values):
+    """1 / values поэлементно, 0 там, где values равно нулю."""
+    result = np.zeros_like(values, dtype=np.float64)
+    np.divide(1.0, values, out=result, where=values > 0)
+    return result
+
+
+class Scorer:
+    """Оценки кандидатов для блоков пользователей матричными
+    произведениями над матрицей подписок F.
+
+    Оценка складывается из голосов похожих читателей — тех, у кого есть
+    общие с пользователем подписки, с весом по косинусной близости их
+    подписок, — и из подписок авторов, которых пользователь уже читает:
+
+        common = F[блок] · Fᵀ (без популярных авторов)
+        scores = diag(1/√n) · common · diag(1/√n) · F
+                 + FRIENDS_WEIGHT · diag(1/n) · F[блок] · F
+    """
+
+    def __init__(self, matrix):
+        self.follows = matrix
+        self.counts = np.asarray(matrix.sum(axis=1)).ravel()
+        readers = np.asarray(matrix.sum(axis=0)).ravel()
+        rare = sparse.diags(
+            (readers <= MAX_SHARED_FOLLOWERS).astype(np.float64)
+        )
+        self.shared = (matrix @ rare).T.tocsr()
+        self.inverse_norms = inverse(np.sqrt(self.counts))
+
+    def block(self, start, stop):
+        """Разреженная матрица оценок пользователей start..stop-1 по всем
+        авторам; прочитанные авторы и сам пользователь обнулены.
+        """
+        own = self.follows[start:stop]
+        common = (own @ self.shared).tolil()
+        common.setdiag(0, k=start)
+        weights = (
+            sparse.diags(self.inverse_norms[start:stop])
+            @ common.tocsr()
+            @ sparse.diags(self.inverse_norms)
+        )
+        friends = sparse.diags(
+            FRIENDS_WEIGHT * inverse(self.counts[start:stop])
+        ) @ own
+        scores = (weights + friends) @ self.follows
+        scores = (scores - scores.multiply(own)).tolil()
+        scores.setdiag(0, k=start)
+        scores = scores.tocsr()
+        scores.eliminate_zeros()
+        return scores
+
+    def best(self, start, stop, limit):
+        """Для строк блока с подписками: номер строки и до limit пар
+        (номер автора, оценка), лучшие первыми, при равенстве — по номеру.
+        """
+        scores = self.block(start, stop)
+        for offset in range(stop - start):
+            if not self.counts[start + offset]:
+                continue
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            values = scores.data[begin:end]
+            columns = scores.indices[begin:end]
+            order = np.lexsort((columns, -values))[:limit]
+            yield start + offset, [
+                (int(columns[index]), float(values[index]))
+                for index in order
+            ]
+
+
+def for_user(user, exclude=None):
+    """Предложения для карточки автора: один запрос по индексу
+    (user, -score), уже прочитанные авторы отсеиваются по кэшу подписок.
+    """
+    if not user.is_authenticated:
+        return []
+    rows = Suggestion.objects.filter(user_id=user.pk).select_related(
+        'author'
+    ).order_by('-score')[:settings.SUGGESTIONS_STORED]
+    authors = [row.author for row in rows if row.author_id != exclude]
+    followed = follow_graph.followed(
+        user.pk, [author.pk for author in authors]
+    )
+    return [
+        author for author in authors if author.pk not in followed
+    ][:settings.SUGGESTIONS_SHOWN]
+
+
+def generation():
+    return feed_cache.generation(GENERATION_KEY)
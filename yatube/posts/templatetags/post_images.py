@@ -0,0 +1,40 @@
+from django import template
+from django.conf import settings
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(image, variant):
+    """Готовые миниатюры для img: src, srcset и размеры, иначе None.
+
+    В src идёт ширина POST_THUMBNAIL_WIDTH или ближайшая к ней из
+    готовых; если готовы не все размеры, картинка ставится в очередь.
+    Миниатюры берутся из пакета thumbnails.prefetch, если он есть.
+    """
+    if not image:
+        return None
+    batch = getattr(image, 'thumbnails', None)
+    if batch is not None and batch.variant == variant:
+        ready = batch.get(image)
+    else:
+        ready = thumbnails.ready(image, variant)
+    sizes, _ = thumbnails.VARIANTS[variant]
+    if len(ready) < len(sizes):
+        thumbnails.schedule(image.name)
+    if not ready:
+        return None
+    src = min(
+        ready,
+        key=lambda thumbnail: abs(
+            thumbnail.width - settings.POST_THUMBNAIL_WIDTH
+        )
+    )
+    return {
+        'src': src,
+        'srcset': ', '.join(
+            f'{thumbnail.url} {thumbnail.width}w' for thumbnail in ready
+        ),
+    }
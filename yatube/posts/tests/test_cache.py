@@ -0,0 +1,93 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from yatube.cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def totals(self, cache):
+        return cache._db.execute(
+            'SELECT entries, bytes, '
+            '(SELECT COUNT(*) FROM cache), (SELECT SUM(size) FROM cache) '
+            'FROM totals'
+        ).fetchone()
+
+    def test_writes_are_visible_to_other_instances(self):
+        """Запись одного экземпляра сразу видна другому соединению."""
+        other = self.make_cache()
+        self.cache.set('page', {'html': '<p>'})
+        self.assertEqual(other.get('page'), {'html': '<p>'})
+        other.delete('page')
+        self.assertIsNone(self.cache.get('page'))
+
+    def test_add_and_incr(self):
+        """add не перезаписывает ключ, incr атомарен и видит чужие записи."""
+        other = self.make_cache()
+        self.assertTrue(self.cache.add('generation', 5))
+        self.assertFalse(other.add('generation', 100))
+        self.assertEqual(other.incr('generation'), 6)
+        self.assertEqual(self.cache.incr('generation', 10), 16)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_entries_are_not_returned(self):
+        """Просроченная запись не возвращается и удаляется."""
+        self.cache.set('short', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertEqual(self.totals(self.cache)[0], 0)
+
+    def test_cull_keeps_limits_and_totals(self):
+        """При переполнении вытесняются записи, счётчик размера точен."""
+        cache = self.make_cache(
+            MAX_ENTRIES=10, MAX_SIZE=1000, CULL_FREQUENCY=3
+        )
+        for number in range(50):
+            cache.set(f'key-{number}', 'x' * 50)
+            cache.set(f'key-{number}', 'y' * 60)
+        entries, size, real_entries, real_size = self.totals(cache)
+        self.assertEqual((entries, size), (real_entries, real_size))
+        self.assertLessEqual(entries, 10)
+        self.assertLessEqual(size, 1000)
+        self.assertEqual(cache.get('key-49'), 'y' * 60)
+
+    def test_zero_cull_frequency_clears_cache(self):
+        """CULL_FREQUENCY=0, как и в Django, очищает кэш целиком."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=0)
+        for number in range(5):
+            cache.set(f'key-{number}', number)
+        self.assertEqual(cache.get('key-4'), 4)
+        self.assertLessEqual(self.totals(cache)[0], 3)
+        self.assertIsNone(cache.get('key-0'))
+
+    def test_reads_batch_access_time_updates(self):
+        """Чтение не пишет время доступа сразу: оно уходит в базу вместе
+        с ближайшей записью.
+        """
+        self.cache.set('page', 'html')
+        self.cache._db.execute('UPDATE cache SET accessed = 0')
+
+        def accessed():
+            return self.cache._db.execute(
+                'SELECT accessed FROM cache WHERE key = ?',
+                (self.cache.make_key('page'),)
+            ).fetchone()[0]
+
+        self.assertEqual(self.cache.get('page'), 'html')
+        self.assertEqual(accessed(), 0)
+        self.cache.set('other', 'value')
+        self.assertGreater(accessed(), 0)
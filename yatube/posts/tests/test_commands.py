@@ -0,0 +1,458 @@
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import suggestions, thumbnails
+from posts.bulk import explicit_dates
+from posts.models import (Comment, Follow, Group, Post, Suggestion,
+                          TimelineEntry, User, UserStats)
+from yatube.middleware import QueryCounter
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class DatasetCommandsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'generate_dataset', users=30, posts=200, groups=3, comments=100,
+            follows=5, batch_size=50, stdout=StringIO()
+        )
+
+    def test_generate_dataset_is_consistent(self):
+        """generate_dataset создаёт данные с верными счётчиками и лентами."""
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Follow.objects.exists())
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Исправлено постов: 0, профилей: 0', out.getvalue())
+        reader = UserStats.objects.filter(following_count__gt=0).first()
+        expected = Post.objects.filter(
+            author__following__user_id=reader.user_id
+        ).count()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=reader.user_id).count(),
+            expected
+        )
+
+    def test_benchmark_views_writes_report(self):
+        """benchmark_views пишет JSON с процентилями по каждой ленте."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            call_command(
+                'benchmark_views', requests=3, output=output,
+                stdout=StringIO()
+            )
+            with open(output, encoding='utf-8') as report:
+                views = json.load(report)['views']
+        self.assertEqual(
+            set(views),
+            {'index', 'group_posts', 'profile', 'post', 'follow_index'}
+        )
+        for row in views.values():
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+    def test_benchmark_views_follows_cursor_to_depth(self):
+        """--depth пролистывает ленту курсором и вне тестового окружения,
+        где у ответа нет context.
+        """
+        get = Client.get
+
+        def without_context(client, *args, **kwargs):
+            response = get(client, *args, **kwargs)
+            response.context = None
+            return response
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            with mock.patch.object(Client, 'get', without_context):
+                call_command(
+                    'benchmark_views', requests=2, depth=3,
+                    views=['index'], output=output, stdout=StringIO()
+                )
+            with open(output, encoding='utf-8') as report:
+                views = json.load(report)['views']
+        self.assertEqual(views['index']['requests'], 6)
+
+    def test_benchmark_views_keeps_cache_by_default(self):
+        """Общий кэш очищается только по явному --clear-cache."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'result.json')
+            for clear_cache in (False, True):
+                cache.set('benchmark-marker', 1)
+                call_command(
+                    'benchmark_views', requests=1, views=['index'],
+                    clear_cache=clear_cache, output=output,
+                    stdout=StringIO()
+                )
+                self.assertEqual(
+                    cache.get('benchmark-marker'), None if clear_cache else 1
+                )
+
+    def test_explicit_dates_restores_previous_value(self):
+        """Вложенный explicit_dates не включает auto_now_add раньше
+        времени, а на выходе возвращает исходное значение.
+        """
+        field = Post._meta.get_field('pub_date')
+        with explicit_dates(field):
+            with explicit_dates(field):
+                pass
+            self.assertFalse(field.auto_now_add)
+        self.assertTrue(field.auto_now_add)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackfillThumbnailsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.state = os.path.join(
+            tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT), 'state.json'
+        )
+        author = User.objects.create_user(username='backfill')
+        for number in range(3):
+            Post.objects.create(
+                text=f'post {number}',
+                author=author,
+                image=SimpleUploadedFile(
+                    f'small_{number}.gif', SMALL_GIF, 'image/gif'
+                )
+            )
+        Post.objects.create(text='no image', author=author)
+
+    def backfill(self):
+        out = StringIO()
+        call_command(
+            'backfill_thumbnails', processes=1, batch_size=2,
+            state=self.state, stdout=out, stderr=StringIO()
+        )
+        return out.getvalue()
+
+    def test_backfill_creates_every_size_and_resumes(self):
+        """Команда создаёт все размеры, а повторный запуск продолжает
+        с сохранённого места.
+        """
+        self.assertIn('Обработано картинок: 3, с ошибкой: 0', self.backfill())
+        sizes = len(thumbnails.VARIANTS['card'][0])
+        for post in Post.objects.exclude(image=''):
+            self.assertEqual(len(thumbnails.ready(post.image, 'card')), sizes)
+        with open(self.state, encoding='utf-8') as state:
+            self.assertEqual(
+                json.load(state)['last_pk'],
+                Post.objects.exclude(image='').latest('pk').pk
+            )
+        self.assertIn('Обработано картинок: 0, с ошибкой: 0', self.backfill())
+
+    def test_backfill_retries_failed_images(self):
+        """Картинка с ошибкой остаётся в файле состояния, и следующий
+        запуск обрабатывает её снова, хотя прогресс ушёл дальше.
+        """
+        broken = Post.objects.exclude(image='').earliest('pk')
+        generate = thumbnails.generate
+
+        def flaky(name):
+            if name == broken.image.name:
+                raise OSError('диск недоступен')
+            return generate(name)
+
+        with mock.patch.object(thumbnails, 'generate', flaky):
+            self.assertIn(
+                'Обработано картинок: 3, с ошибкой: 1', self.backfill()
+            )
+        with open(self.state, encoding='utf-8') as state:
+            self.assertEqual(json.load(state)['failed'], [broken.pk])
+        self.assertEqual(thumbnails.ready(broken.image, 'card'), [])
+        self.assertIn('Обработано картинок: 1, с ошибкой: 0', self.backfill())
+        self.assertNotEqual(thumbnails.ready(broken.image, 'card'), [])
+        with open(self.state, encoding='utf-8') as state:
+            self.assertEqual(json.load(state)['failed'], [])
+
+
+class JsonlCommandsTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(3):
+            post = Post.objects.create(
+                text=f'post {number}', author=self.author, group=group
+            )
+        Comment.objects.create(post=post, author=self.reader, text='comment')
+        Follow.objects.create(user=self.reader, author=self.author)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'dump.jsonl')
+        call_command('export_jsonl', self.path, stderr=StringIO())
+
+    def snapshot(self):
+        return (
+            list(Group.objects.values_list('slug', 'title')),
+            list(Post.objects.order_by('pub_date', 'text').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug'
+            )),
+            list(Comment.objects.values_list('post__text', 'text')),
+            list(Follow.objects.values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def load(self, **options):
+        call_command(
+            'import_jsonl', self.path, batch_size=2, stdout=StringIO(),
+            **options
+        )
+
+    def test_export_import_round_trip(self):
+        """Выгрузка загружается обратно со связями, счётчиками и лентами,
+        а повторная загрузка ничего не дублирует.
+        """
+        expected = self.snapshot()
+        for model in (Follow, Comment, Post, Group):
+            model.objects.all().delete()
+        self.load()
+        self.load()
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(Post.objects.latest('pk').comment_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_import_into_populated_database(self):
+        """id из файла, занятые в базе чужими постами, не перепутывают
+        связи, а новые посты попадают в ленты уже подписанных.
+        """
+        posts = list(Post.objects.order_by('pk'))
+        Post.objects.all().delete()
+        other = User.objects.create_user(username='other')
+        for post in posts:
+            Post.objects.create(pk=post.pk, text='чужой', author=other)
+        out = StringIO()
+        call_command('import_jsonl', self.path, batch_size=2, stdout=out)
+        self.assertEqual(Post.objects.filter(author=other).count(), 3)
+        self.assertEqual(
+            Comment.objects.get().post.text, posts[-1].text
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertIn('posts.follow: прочитано 1, пропущено 1', out.getvalue())
+
+    def test_comments_refer_to_posts_by_natural_key(self):
+        """Комментарий ссылается на пост автором и датой, а не id базы,
+        из которой сделана выгрузка.
+        """
+        with open(self.path, encoding='utf-8') as dump:
+            rows = [json.loads(line) for line in dump]
+        comment = next(
+            row for row in rows if row['model'] == 'posts.comment'
+        )
+        self.assertNotIn('id', comment)
+        self.assertEqual(comment['post_author'], 'author')
+        Comment.objects.all().delete()
+        self.load()
+        self.assertEqual(
+            Comment.objects.get().post, Post.objects.latest('pub_date')
+        )
+
+    def test_missing_users_are_skipped_or_created(self):
+        """Записи неизвестных пользователей пропускаются, если их не
+        просили создать.
+        """
+        Post.objects.all().delete()
+        self.reader.delete()
+        self.load()
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertFalse(Comment.objects.exists())
+        self.load(create_users=True)
+        self.assertEqual(
+            Comment.objects.get().author.username, 'reader'
+        )
+        self.assertEqual(Follow.objects.count(), 1)
+
+
+def direct_scores(follows, max_shared):
+    """Оценки рекомендаций по определению, перебором: follows — id
+    пользователя -> множество id авторов.
+    """
+    readers = {}
+    for user_id, authors in follows.items():
+        for author_id in authors:
+            readers.setdefault(author_id, set()).add(user_id)
+    result = {}
+    for user_id, own in follows.items():
+        scores = Counter()
+        for author_id in own:
+            for candidate in follows.get(author_id, ()):
+                scores[candidate] += suggestions.FRIENDS_WEIGHT / len(own)
+        for reader, theirs in follows.items():
+            common = sum(
+                len(readers[author_id]) <= max_shared
+                for author_id in own & theirs
+            )
+            if reader == user_id or not common:
+                continue
+            for candidate in theirs:
+                scores[candidate] += common / math.sqrt(len(own) * len(theirs))
+        result[user_id] = {
+            author_id: score for author_id, score in scores.items()
+            if author_id != user_id and author_id not in own
+        }
+    return result
+
+
+class SuggestionsCommandTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader, self.twin, self.loner, x, y, z, w = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'twin', 'loner', 'x', 'y', 'z', 'w')
+        )
+        self.authors = {'x': x, 'y': y, 'z': z, 'w': w}
+        for user, author in (
+            (self.reader, x), (self.reader, y),
+            (self.twin, x), (self.twin, y), (self.twin, z),
+            (x, w),
+        ):
+            Follow.objects.create(user=user, author=author)
+        Suggestion.objects.create(user=self.loner, author=x, score=1)
+
+    def suggested(self, user):
+        return list(
+            Suggestion.objects.filter(user=user).order_by(
+                '-score'
+            ).values_list('author__username', flat=True)
+        )
+
+    def test_build_suggestions(self):
+        """Похожие читатели и подписки читаемых авторов дают рекомендации,
+        уже прочитанные авторы и сам пользователь в них не попадают.
+        """
+        call_command('build_suggestions', batch_size=2, stdout=StringIO())
+        self.assertEqual(self.suggested(self.reader), ['z', 'w'])
+        self.assertEqual(self.suggested(self.twin), ['w'])
+        self.assertEqual(self.suggested(self.loner), [])
+
+    def test_matrix_scores_match_direct_count(self):
+        """Матричные оценки совпадают с прямым подсчётом голосов по
+        определению, в том числе с отсечкой популярных авторов.
+        """
+        noise = random.Random(7)
+        users = [
+            User.objects.create_user(username=f'user{number}')
+            for number in range(30)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author)
+            for user in users for author in noise.sample(users, 6)
+            if author != user
+        )
+        follows = {}
+        for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id'
+        ):
+            follows.setdefault(user_id, set()).add(author_id)
+        with mock.patch.object(suggestions, 'MAX_SHARED_FOLLOWERS', 8):
+            ids, matrix = suggestions.load_matrix()
+            scorer = suggestions.Scorer(matrix)
+            computed = {
+                int(ids[row]): {
+                    int(ids[column]): score for column, score in best
+                }
+                for row, best in scorer.best(0, len(ids), len(ids))
+            }
+        for user_id, expected in direct_scores(follows, 8).items():
+            with self.subTest(user_id=user_id):
+                self.assertEqual(set(computed[user_id]), set(expected))
+                for author_id, score in expected.items():
+                    self.assertAlmostEqual(
+                        computed[user_id][author_id], score
+                    )
+
+    def test_author_card_hides_followed_suggestions(self):
+        """Карточка автора показывает рекомендации без тех, на кого
+        зритель подписался после расчёта.
+        """
+        call_command('build_suggestions', stdout=StringIO())
+        client = Client()
+        client.force_login(self.reader)
+        url = reverse('profile', args=['x'])
+        response = client.get(url)
+        self.assertEqual(
+            response.context['suggestions'],
+            [self.authors['z'], self.authors['w']]
+        )
+        self.assertContains(response, reverse('profile', args=['z']))
+        Follow.objects.create(user=self.reader, author=self.authors['z'])
+        response = client.get(url)
+        self.assertEqual(response.context['suggestions'], [self.authors['w']])
+
+
+class SQLiteProfileTest(TestCase):
+    def test_connection_is_configured(self):
+        """Соединение с базой получает PRAGMA из SQLITE_PRAGMAS."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_pragmas_are_not_counted(self):
+        """PRAGMA нового соединения не попадают в счётчик запросов."""
+        default = connections['default']
+        probe = default.__class__(default.settings_dict, 'probe')
+        self.addCleanup(probe.close)
+        counter = QueryCounter()
+        with probe.execute_wrapper(counter):
+            probe.ensure_connection()
+        self.assertEqual(counter.count, 0)
+        with probe.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+
+    def test_benchmark_compares_profiles(self):
+        """benchmark_sqlite печатает строку на каждый профиль."""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', writers=2, readers=1, seconds=0.2, stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[0] for line in lines], ['stock', 'production']
+        )
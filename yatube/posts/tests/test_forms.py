@@ -1,10 +1,13 @@
+import random
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post, User
@@ -86,6 +89,62 @@ class PostFormTests(TestCase):
             ).first()
         )
 
+    @override_settings(POST_IMAGE_MAX_SIZE=100)
+    def test_uploaded_image_is_normalized(self):
+        """Загруженное фото уменьшается, поворачивается по EXIF, теряет
+        метаданные и перекодируется; экономия пишется в лог.
+        """
+        photo = Image.new('RGB', (400, 200), 'red')
+        exif = photo.getexif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Phone'
+        content = BytesIO()
+        photo.save(content, 'JPEG', exif=exif.tobytes(), quality=95)
+        form_data = {
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile(
+                'photo.jpg', content.getvalue(), content_type='image/jpeg'
+            ),
+        }
+        with self.assertLogs('posts.images', 'INFO') as logs:
+            self.authorized_client.post(URL_NEW_POST, data=form_data)
+        self.assertIn('сэкономлено', logs.output[0])
+        post = Post.objects.get(image__startswith='posts/photo')
+        self.assertEqual(post.image.name, 'posts/photo.webp')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'WEBP')
+            self.assertEqual(stored.size, (50, 100))
+            self.assertFalse(stored.getexif())
+        self.assertLess(post.image.size, len(content.getvalue()))
+
+    def test_compact_image_is_not_reencoded(self):
+        """Небольшая картинка, которую перекодирование только раздует,
+        сохраняется в исходном формате, но без EXIF.
+        """
+        noise = random.Random(1)
+        drawing = Image.new('1', (64, 64))
+        drawing.putdata([noise.choice((0, 255)) for _ in range(64 * 64)])
+        exif = drawing.getexif()
+        exif[0x010F] = 'Phone'
+        content = BytesIO()
+        drawing.save(content, 'PNG', exif=exif.tobytes())
+        form_data = {
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile(
+                'drawing.png', content.getvalue(), content_type='image/png'
+            ),
+        }
+        with self.assertLogs('posts.images', 'INFO') as logs:
+            self.authorized_client.post(URL_NEW_POST, data=form_data)
+        self.assertIn('исходный файл', logs.output[0])
+        post = Post.objects.get(image__startswith='posts/drawing')
+        self.assertEqual(post.image.name, 'posts/drawing.png')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'PNG')
+            self.assertFalse(stored.getexif())
+            self.assertEqual(stored.tobytes(), drawing.tobytes())
+        self.assertLess(post.image.size, len(content.getvalue()))
+
     def test_post_edit_creat(self):
         """Валидная форма редактирования поста сохраняется в базе."""
         posts_count = Post.objects.count()
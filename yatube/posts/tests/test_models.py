@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Comment, Follow, Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserStats
 
 USERNAME = 'Harry'
 USERNAME_2 = 'Ron'
@@ -66,3 +69,52 @@ class PostsModelTests(TestCase):
         follow = PostsModelTests.follow
         expected_object_name = follow.user
         self.assertEqual(expected_object_name, follow.user)
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=USERNAME)
+        self.user2 = User.objects.create_user(username=USERNAME_2)
+        self.post = Post.objects.create(text=POST_TEXT, author=self.user)
+
+    def assertStats(self, user, posts, followers, following):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following)
+        )
+
+    def test_comment_count_follows_comments(self):
+        """Счётчик комментариев растёт и убывает вместе с комментариями."""
+        comment = Comment.objects.create(
+            post=self.post, author=self.user2, text=COMMENT_TEXT
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_user_stats_follow_posts_and_follows(self):
+        """Счётчики профиля отражают посты и подписки."""
+        follow = Follow.objects.create(user=self.user2, author=self.user)
+        self.assertStats(self.user, 1, 1, 0)
+        self.assertStats(self.user2, 0, 0, 1)
+        follow.delete()
+        self.post.delete()
+        self.assertStats(self.user, 0, 0, 0)
+        self.assertStats(self.user2, 0, 0, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        """reconcile_counters чинит разошедшиеся счётчики."""
+        Follow.objects.create(user=self.user2, author=self.user)
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        UserStats.objects.filter(user=self.user2).update(posts_count=3)
+        out = StringIO()
+        call_command('reconcile_counters', chunk_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertStats(self.user, 1, 1, 0)
+        self.assertStats(self.user2, 0, 0, 1)
+        self.assertIn('профилей: 2', out.getvalue())
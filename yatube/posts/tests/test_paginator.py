@@ -1,7 +1,11 @@
+import warnings
+
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from posts.models import Group, Post, User
+from posts import comments
+from posts.models import Comment, Group, Post, User
+from posts.paginators import CursorPaginator, MergedCursorPaginator
 
 USERNAME = 'Elon Musk'
 GROUP_SLUG = 'elon'
@@ -51,5 +55,85 @@ class PaginatorViewsTests(TestCase):
 
     def test_profile_page2_contains_three_records(self):
         """На 2 страницу profile передаётся 3 записи."""
-        response = self.authorized_client.get(URL_PROFILE + '?page=2')
+        response = self.authorized_client.get(URL_PROFILE)
+        cursor = response.context['page'].next_cursor
+        response = self.authorized_client.get(URL_PROFILE, {'cursor': cursor})
         self.assertEqual(len(response.context['page']), 3)
+        self.assertFalse(response.context['page'].has_next())
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор назад возвращает те же записи, что и первая страница."""
+        first = self.guest_client.get(URL_HOMEPAGE).context['page']
+        first_ids = [post.id for post in first]
+        second = self.guest_client.get(
+            URL_HOMEPAGE, {'cursor': first.next_cursor}
+        ).context['page']
+        self.assertTrue(second.has_previous())
+        back = self.guest_client.get(
+            URL_HOMEPAGE, {'cursor': second.previous_cursor}
+        ).context['page']
+        self.assertEqual([post.id for post in back], first_ids)
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.guest_client.get(URL_HOMEPAGE, {'cursor': '!!!'})
+        self.assertEqual(len(response.context['page']), 10)
+
+    def test_pages_do_not_share_state(self):
+        """Курсоры лежат на странице: вторая страница того же пагинатора
+        не меняет первую, а счётчики не роняют шаблон.
+        """
+        paginator = CursorPaginator(Post.objects.all(), 5)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+        self.assertIsNone(first.previous_cursor)
+        self.assertIsNotNone(second.previous_cursor)
+        self.assertIsNone(paginator.count)
+        self.assertIsNone(paginator.num_pages)
+        self.assertIsNone(paginator.page_range)
+        self.assertEqual(second.start_index(), 6)
+        self.assertEqual(list(second.paginator.page_range), [1, 2, 3])
+
+    def test_comments_page_is_ordered(self):
+        """Комментарии листаются по упорядоченному queryset без
+        UnorderedObjectListWarning.
+        """
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=str(number))
+            for number in range(3)
+        )
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            page = comments.page(post.id, None, ('text',))
+        self.assertEqual([row['text'] for row in page], ['0', '1', '2'])
+        self.assertEqual(caught, [])
+
+    def test_merged_pages_are_full_despite_duplicates(self):
+        """Записи, пришедшие из нескольких источников, показываются один
+        раз и не укорачивают страницу.
+        """
+        posts = Post.objects.all()
+        ordering = ('-pub_date', '-id')
+        sources = [
+            (posts, ordering, lambda post: post),
+            (posts.filter(pk__in=posts.order_by('-id')[:7]), ordering,
+             lambda post: post),
+        ]
+        pages, cursor = [], None
+        while True:
+            page = MergedCursorPaginator(sources, 5, Post).get_page(cursor)
+            pages.append([post.id for post in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([len(ids) for ids in pages], [5, 5, 3])
+        self.assertEqual(
+            sum(pages, []),
+            list(posts.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            ))
+        )
@@ -0,0 +1,307 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import thumbnails, urls
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from yatube.middleware import count_queries, query_budget
+
+USERNAME = 'Frodo'
+USERNAME_2 = 'Sam'
+GROUP_SLUG = 'shire'
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class QueryBudgetMixin:
+    """Проверка потолка SQL-запросов на запрос к маршруту."""
+
+    def assertWithinBudget(self, client, url, url_name, data=None):
+        """GET по url или POST, если переданы данные формы."""
+        with count_queries() as counter:
+            if data is None:
+                response = client.get(url)
+            else:
+                response = client.post(url, data)
+        self.assertLess(response.status_code, 400, url)
+        self.assertLessEqual(
+            counter.count, query_budget(url_name),
+            f'{url_name}: {counter.count} запросов'
+        )
+        return response
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME_2)
+        cls.group = Group.objects.create(
+            title=GROUP_SLUG, slug=GROUP_SLUG, description=GROUP_SLUG
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for number in range(settings.MAX_PAGE):
+            post = Post.objects.create(
+                text=f'post {number}',
+                author=cls.user,
+                group=cls.group,
+                image=SimpleUploadedFile(
+                    name=f'small_{number}.gif',
+                    content=SMALL_GIF,
+                    content_type='image/gif'
+                )
+            )
+            Comment.objects.bulk_create(
+                Comment(post=post, author=cls.reader, text=f'comment {i}')
+                for i in range(settings.MAX_PAGE)
+            )
+        cls.post = post
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(QueryBudgetTest.reader)
+
+    def route_urls(self):
+        post = QueryBudgetTest.post
+        return {
+            'index': reverse('index'),
+            'follow_index': reverse('follow_index'),
+            'group_posts': reverse('group_posts', args=[GROUP_SLUG]),
+            'profile': reverse('profile', args=[USERNAME]),
+            'post': reverse('post', args=[USERNAME, post.id]),
+            'post_comments': reverse(
+                'post_comments', args=[USERNAME, post.id]
+            ),
+            'post_edit': reverse('post_edit', args=[USERNAME, post.id]),
+            'add_comment': reverse('add_comment', args=[USERNAME, post.id]),
+            'new_post': reverse('new_post'),
+            'search': reverse('search') + '?q=post',
+            'autocomplete': reverse('autocomplete') + '?q=fr',
+            'profile_follow': reverse('profile_follow', args=[USERNAME]),
+            'profile_unfollow': reverse('profile_unfollow', args=[USERNAME]),
+            'api_index': reverse('api_index'),
+            'api_follow_index': reverse('api_follow_index'),
+            'api_group_posts': reverse('api_group_posts', args=[GROUP_SLUG]),
+            'api_profile': reverse('api_profile', args=[USERNAME]),
+            'api_post': reverse('api_post', args=[USERNAME, post.id]),
+            'api_post_comments': reverse(
+                'api_post_comments', args=[USERNAME, post.id]
+            ),
+        }
+
+    def test_every_route_is_covered(self):
+        """Для каждого маршрута posts/urls.py задан потолок запросов."""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(self.route_urls()))
+        self.assertTrue(names <= set(settings.QUERY_BUDGETS))
+
+    def test_routes_stay_within_budget(self):
+        """Страница из 10 постов с картинками, группами и комментариями
+        укладывается в бюджет SQL-запросов маршрута.
+        """
+        # Миниатюры создаёт фоновый пул; меряем страницы с готовыми.
+        for post in Post.objects.all():
+            thumbnails.generate(post.image.name)
+        for url_name, url in self.route_urls().items():
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                self.assertWithinBudget(self.client, url, url_name)
+
+    def test_writes_stay_within_budget(self):
+        """Отправка форм и подписка с отпиской, которые действительно
+        пишут в базу, укладываются в бюджет своих маршрутов.
+        """
+        post = QueryBudgetTest.post
+        author = Client()
+        author.force_login(QueryBudgetTest.user)
+        fan = Client()
+        fan.force_login(User.objects.create_user(username='Pippin'))
+        image = SimpleUploadedFile(
+            name='new.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        writes = (
+            (author, 'new_post', reverse('new_post'), {
+                'text': 'new post', 'group': QueryBudgetTest.group.id,
+                'image': image,
+            }),
+            (author, 'post_edit', reverse(
+                'post_edit', args=[USERNAME, post.id]
+            ), {'text': 'edited', 'group': QueryBudgetTest.group.id}),
+            (self.client, 'add_comment', reverse(
+                'add_comment', args=[USERNAME, post.id]
+            ), {'text': 'new comment'}),
+            (fan, 'profile_follow', reverse(
+                'profile_follow', args=[USERNAME]
+            ), None),
+            (fan, 'profile_unfollow', reverse(
+                'profile_unfollow', args=[USERNAME]
+            ), None),
+        )
+        for client, url_name, url, data in writes:
+            with self.subTest(url_name=url_name):
+                cache.clear()
+                self.assertWithinBudget(client, url, url_name, data)
+        # Каждая запись действительно прошла, а не вернула форму.
+        self.assertTrue(Post.objects.filter(text='new post').exists())
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'edited')
+        self.assertTrue(Comment.objects.filter(text='new comment').exists())
+        self.assertFalse(Follow.objects.filter(
+            user__username='Pippin'
+        ).exists())
+        self.assertEqual(
+            UserStats.objects.get(user=QueryBudgetTest.user).followers_count,
+            1
+        )
+
+    def test_post_view_does_not_grow_with_comments(self):
+        """Число запросов страницы поста не зависит от числа комментариев
+        и их авторов.
+        """
+        post = QueryBudgetTest.post
+        url = reverse('post', args=[USERNAME, post.id])
+        thumbnails.generate(post.image.name)
+        counts = []
+        for round_ in range(2):
+            cache.clear()
+            with count_queries() as counter:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            counts.append(counter.count)
+            Comment.objects.bulk_create(
+                Comment(
+                    post=post,
+                    author=User.objects.create_user(
+                        username=f'commenter_{round_}_{number}'
+                    ),
+                    text='comment'
+                )
+                for number in range(settings.MAX_PAGE)
+            )
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[0], query_budget('post'))
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        """При DEBUG ответ содержит число запросов и их время."""
+        response = self.client.get(reverse('index'))
+        self.assertIn('X-DB-Queries', response)
+        self.assertIn('X-DB-Time', response)
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент читают индексы в порядке вывода.
+
+    Каждый SELECT страниц лент прогоняется через EXPLAIN QUERY PLAN;
+    проход таблицы или индекса целиком при фильтре и сортировка во
+    временном B-дереве значат, что запрос перестал попадать в индекс.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=USERNAME_2)
+        group = Group.objects.create(
+            title=GROUP_SLUG, slug=GROUP_SLUG, description=GROUP_SLUG
+        )
+        Follow.objects.create(user=cls.reader, author=author)
+        for number in range(settings.MAX_PAGE * 2):
+            post = Post.objects.create(
+                text=f'post {number}', author=author, group=group
+            )
+        Comment.objects.bulk_create(
+            Comment(post=post, author=cls.reader, text=f'comment {number}')
+            for number in range(settings.COMMENTS_PAGE * 2)
+        )
+        cls.urls = (
+            reverse('index'),
+            reverse('group_posts', args=[GROUP_SLUG]),
+            reverse('profile', args=[USERNAME]),
+            reverse('follow_index'),
+            reverse('post', args=[USERNAME, post.id]),
+            reverse('post_comments', args=[USERNAME, post.id]),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(QueryPlanTest.reader)
+
+    def feed_queries(self):
+        """SELECT-запросы первых и вторых страниц всех лент."""
+        # Иначе главная отдаётся из кэша фрагментов без запросов.
+        cache.clear()
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(capture):
+            for url in QueryPlanTest.urls:
+                response = self.client.get(url)
+                page = response.context.get('page')
+                if page and page.next_cursor:
+                    self.client.get(url, {
+                        'cursor': page.next_cursor
+                    })
+        return queries
+
+    def plan(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, sql, params):
+        for step in self.plan(sql, params):
+            # Проход индекса целиком допустим только для ленты без
+            # фильтра: её первые строки и есть страница.
+            full_scan = step.startswith('SCAN ') and (
+                ' USING ' not in step or ' WHERE ' in sql
+            )
+            self.assertFalse(full_scan, f'{step}\n{sql}')
+            self.assertNotIn('TEMP B-TREE', step, sql)
+
+    def test_feed_queries_use_indexes(self):
+        """Ни один запрос лент, в том числе с пулом популярных авторов,
+        не читает таблицу целиком и не сортирует результат.
+        """
+        for pulled in (False, True):
+            UserStats.objects.filter(user__username=USERNAME).update(
+                pulled=pulled
+            )
+            for sql, params in self.feed_queries():
+                with self.subTest(pulled=pulled, sql=sql):
+                    self.assertUsesIndexes(sql, params)
+
+    def test_followers_lookup_uses_index(self):
+        """Подписчики автора для fan-out читаются из индекса (author, user).
+        """
+        followers = Follow.objects.filter(author_id=1).values('user_id')
+        sql, params = followers.query.sql_with_params()
+        self.assertEqual(
+            self.plan(sql, params),
+            ['SEARCH posts_follow USING COVERING INDEX follow_author_user '
+             '(author_id=?)']
+        )
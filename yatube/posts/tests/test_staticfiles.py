@@ -0,0 +1,77 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from yatube import staticfiles
+
+CSS = b'body { color: black; }\n' * 200
+
+
+class StaticFilesTest(SimpleTestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'wb') as file:
+            file.write(CSS)
+        settings = override_settings(
+            STATIC_ROOT=self.root,
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_STORAGE='yatube.staticfiles.CompressedManifestStorage',
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        staticfiles.hashed_names.cache_clear()
+        self.addCleanup(staticfiles.hashed_names.cache_clear)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed = staticfiles_storage.stored_name('css/site.css')
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        request = self.factory.get('/static/' + path, **headers)
+        return staticfiles.serve(request, path)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        """collectstatic кладёт рядом с файлами с хешем их сжатые копии."""
+        self.assertNotEqual(self.hashed, 'css/site.css')
+        with staticfiles_storage.open(self.hashed + '.gz') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), CSS)
+        self.assertEqual(
+            staticfiles_storage.exists(self.hashed + '.br'),
+            staticfiles.brotli is not None
+        )
+
+    def test_serve_picks_variant_by_accept_encoding(self):
+        """Сжатая копия выбирается по Accept-Encoding, а не сжимается."""
+        response = self.get(self.hashed, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), CSS
+        )
+        response = self.get(self.hashed)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(response.streaming_content), CSS)
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+    def test_only_hashed_names_are_immutable(self):
+        """Файл с хешем кэшируется навсегда, исходное имя — перепроверяется."""
+        self.assertEqual(
+            self.get(self.hashed)['Cache-Control'], staticfiles.IMMUTABLE
+        )
+        response = self.get('css/site.css')
+        self.assertEqual(response['Cache-Control'], staticfiles.REVALIDATE)
+        not_modified = self.get(
+            'css/site.css', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        with self.assertRaises(staticfiles.Http404):
+            self.get('../settings.py')
@@ -1,6 +1,10 @@
 import shutil
 import tempfile
+from contextlib import ExitStack
+from html.parser import HTMLParser
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
@@ -8,10 +12,18 @@ from django.conf.urls import handler404
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from yatube.middleware import QueryCounter
+from posts import (autocomplete, feed_cache, follow_graph, suggestions,
+                   thumbnails)
 from posts.forms import PostForm
-from posts.models import Comment, Follow, Group, Post, User
+from posts.models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                          UserStats)
 
 User = get_user_model()
 USERNAME = 'JonSnow'
@@ -50,6 +62,25 @@ uploaded = SimpleUploadedFile(
 )
 
 
+class CardImageParser(HTMLParser):
+    """Собирает атрибуты тегов <img class="card-img">."""
+
+    def __init__(self):
+        super().__init__()
+        self.images = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'img' and 'card-img' in attrs.get('class', '').split():
+            self.images.append(attrs)
+
+
+def card_images(response):
+    parser = CardImageParser()
+    parser.feed(response.content.decode())
+    return parser.images
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsViewsTest(TestCase):
     @classmethod
@@ -88,6 +119,8 @@ class PostsViewsTest(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Подписки в кэше переживают откат транзакции прошлого теста.
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(PostsViewsTest.user)
@@ -146,6 +179,61 @@ class PostsViewsTest(TestCase):
             PostsViewsTest.post.image
         )
 
+    def test_thumbnail_placeholder_until_generated(self):
+        """Пока миниатюры нет, страница показывает заглушку и не создаёт
+        миниатюру сама; после генерации показывается картинка.
+        """
+        cache.clear()
+        image = PostsViewsTest.post.image
+        self.assertEqual(thumbnails.ready(image, 'card'), [])
+        response = self.guest_client.get(GROUP_POSTS)
+        self.assertEqual(card_images(response), [])
+        self.assertEqual(thumbnails.ready(image, 'card'), [])
+        thumbnails.generate(image.name)
+        ready = thumbnails.ready(image, 'card')
+        self.assertEqual(
+            [(thumbnail.width, thumbnail.height) for thumbnail in ready],
+            [(480, 170), (960, 339), (1440, 508)]
+        )
+        response = self.guest_client.get(GROUP_POSTS)
+        [card] = card_images(response)
+        self.assertEqual(card['src'], ready[1].url)
+        self.assertEqual(
+            [candidate.split() for candidate in card['srcset'].split(',')],
+            [[ready[0].url, '480w'], [ready[1].url, '960w'],
+             [ready[2].url, '1440w']]
+        )
+        self.assertEqual(card['loading'], 'lazy')
+
+    def test_page_thumbnails_are_read_in_one_batch(self):
+        """Миниатюры всех постов страницы читаются одним запросом."""
+        posts = [PostsViewsTest.post]
+        for number in range(3):
+            posts.append(Post.objects.create(
+                text=f'{POST_TEXT} {number}',
+                author=PostsViewsTest.user,
+                image=SimpleUploadedFile(
+                    f'batch_{number}.gif', small_gif, 'image/gif'
+                )
+            ))
+        for post in posts[1:]:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            batch = thumbnails.ready_many(
+                [post.image for post in posts], 'card'
+            )
+        for post in posts:
+            self.assertEqual(
+                [thumbnail.url for thumbnail in batch[post.image.name]],
+                [
+                    thumbnail.url
+                    for thumbnail in thumbnails.ready(post.image, 'card')
+                ]
+            )
+        with self.assertNumQueries(0):
+            thumbnails.ready_many([post.image for post in posts], 'card')
+
     def test_new_post_show_correct_context(self):
         """Шаблон new_post сформирован с правильным контекстом."""
         response = self.authorized_client.get(URL_NEW_POST)
@@ -253,6 +341,57 @@ class PostsViewsTest(TestCase):
         ).count()
         self.assertNotEqual(follows, 1)
 
+    def test_follow_survives_stale_cache(self):
+        """Подписка при устаревшем кэше подписок не падает и не
+        создаёт дубль.
+        """
+        follower = PostsViewsTest.user3
+        author = PostsViewsTest.user2
+        self.assertFalse(follow_graph.is_following(follower.pk, author.pk))
+        Follow.objects.bulk_create([Follow(user=follower, author=author)])
+        response = self.authorized_follower.get(PROFILE_FOLLOW)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            Follow.objects.filter(user=follower, author=author).count(), 1
+        )
+        self.assertTrue(follow_graph.is_following(follower.pk, author.pk))
+
+    def test_profile_shows_follow_state(self):
+        """Карточка автора показывает, подписан ли на него зритель."""
+        url = f'/{USERNAME_2}/'
+        response = self.authorized_follower.get(url)
+        self.assertFalse(response.context['following'])
+        self.authorized_follower.get(PROFILE_FOLLOW)
+        response = self.authorized_follower.get(url)
+        self.assertTrue(response.context['following'])
+        self.assertContains(response, 'Отписаться')
+        self.authorized_follower.get(PROFILE_UNFOLLOW)
+        response = self.authorized_follower.get(url)
+        self.assertFalse(response.context['following'])
+
+    def test_follow_graph_answers_from_cache(self):
+        """Проверки подписок после первого чтения не ходят в базу."""
+        follower = PostsViewsTest.user3
+        Follow.objects.create(user=follower, author=PostsViewsTest.user2)
+        Follow.objects.create(user=follower, author=PostsViewsTest.user)
+        self.assertEqual(
+            list(follow_graph.following(follower.pk)),
+            sorted([PostsViewsTest.user.pk, PostsViewsTest.user2.pk])
+        )
+        authors = [PostsViewsTest.user2.pk, follower.pk, 10 ** 12]
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follow_graph.followed(follower.pk, authors),
+                {PostsViewsTest.user2.pk}
+            )
+            self.assertTrue(
+                follow_graph.is_following(follower.pk, PostsViewsTest.user.pk)
+            )
+        Follow.objects.filter(user=follower).delete()
+        self.assertFalse(
+            follow_graph.is_following(follower.pk, PostsViewsTest.user.pk)
+        )
+
     def test_new_post_check_at_followers(self):
         """Новый пост пользователя появляется у подписчиков и
         не появляется у не подписанных подьзователей.
@@ -291,3 +430,702 @@ class PostsViewsTest(TestCase):
                 text=COMMENT_TEXT,
             ), form_data['text']
         )
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.follower = User.objects.create_user(username=USERNAME_3)
+
+    def setUp(self):
+        self.follower_client = Client()
+        self.follower_client.force_login(FollowTimelineTest.follower)
+
+    def feed_texts(self):
+        response = self.follower_client.get(URL_FOLLOW)
+        return [post.text for post in response.context['page']]
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        """Лента подписок не длиннее FOLLOW_TIMELINE_LENGTH."""
+        for number in range(3):
+            Post.objects.create(
+                text=f'{POST_TEXT} {number}',
+                author=FollowTimelineTest.author
+            )
+        Follow.objects.create(
+            user=FollowTimelineTest.follower,
+            author=FollowTimelineTest.author
+        )
+        self.assertEqual(
+            self.feed_texts(), [f'{POST_TEXT} 2', f'{POST_TEXT} 1']
+        )
+        Post.objects.create(
+            text=f'{POST_TEXT} 3',
+            author=FollowTimelineTest.author
+        )
+        self.assertEqual(
+            self.feed_texts(), [f'{POST_TEXT} 3', f'{POST_TEXT} 2']
+        )
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=3)
+    def test_fan_out_to_full_timelines_is_bounded(self):
+        """Новый пост в полные ленты стоит не больше двух коротких
+        запросов по индексу на подписчика, без коррелированных подзапросов.
+        """
+        author = FollowTimelineTest.author
+        followers = [
+            User.objects.create_user(username=f'reader{number}')
+            for number in range(5)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author) for user in followers
+        )
+        for number in range(3):
+            Post.objects.create(text=f'{POST_TEXT} {number}', author=author)
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(text=CASH_TEXT, author=author)
+        for user in followers:
+            entries = TimelineEntry.objects.filter(user=user)
+            self.assertEqual(entries.count(), 3)
+            self.assertTrue(entries.filter(post=post).exists())
+        statements = [query['sql'] for query in queries.captured_queries]
+        self.assertLessEqual(len(statements), 10 + 2 * len(followers))
+        deletes = [sql for sql in statements if sql.startswith('DELETE')]
+        self.assertEqual(len(deletes), len(followers))
+        for sql in deletes:
+            self.assertNotIn('SELECT', sql)
+        cutoff = TimelineEntry.objects.filter(user=followers[0]).order_by(
+            '-pub_date', '-post_id'
+        ).values_list('pub_date', 'post_id')[3:4]
+        sql, params = cutoff.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('timeline_user_pub_date', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_unfollow_prunes_timeline(self):
+        """После отписки посты автора уходят из ленты."""
+        Post.objects.create(text=POST_TEXT, author=FollowTimelineTest.author)
+        follow = Follow.objects.create(
+            user=FollowTimelineTest.follower,
+            author=FollowTimelineTest.author
+        )
+        self.assertEqual(self.feed_texts(), [POST_TEXT])
+        follow.delete()
+        self.assertEqual(self.feed_texts(), [])
+
+    def test_pulled_author_is_merged_into_feed(self):
+        """Посты популярного автора читаются при показе и сливаются
+        с разложенными постами остальных авторов.
+        """
+        star = User.objects.create_user(username=USERNAME_2)
+        fan = User.objects.create_user(username=GROUP_SLUG)
+        Follow.objects.create(
+            user=FollowTimelineTest.follower,
+            author=FollowTimelineTest.author
+        )
+        with override_settings(FOLLOW_PULL_THRESHOLD=2):
+            Follow.objects.create(user=fan, author=star)
+            Follow.objects.create(
+                user=FollowTimelineTest.follower,
+                author=star
+            )
+            author = FollowTimelineTest.author
+            Post.objects.create(text='push 1', author=author)
+            Post.objects.create(text='pull 1', author=star)
+            Post.objects.create(text='push 2', author=author)
+            self.assertFalse(
+                TimelineEntry.objects.filter(author=star).exists()
+            )
+            self.assertEqual(
+                self.feed_texts(), ['push 2', 'pull 1', 'push 1']
+            )
+
+    @override_settings(FOLLOW_PULL_THRESHOLD=2, FOLLOW_PUSH_THRESHOLD=2)
+    def test_posts_survive_mode_switch(self):
+        """Посты, написанные пока автора читали при показе, остаются в
+        ленте после возврата к раскладке, и наоборот.
+        """
+        star = User.objects.create_user(username=USERNAME_2)
+        fan = User.objects.create_user(username=GROUP_SLUG)
+        Post.objects.create(text='push 1', author=star)
+        Follow.objects.create(user=FollowTimelineTest.follower, author=star)
+        fan_follow = Follow.objects.create(user=fan, author=star)
+        self.assertTrue(UserStats.objects.get(user=star).pulled)
+        self.assertFalse(TimelineEntry.objects.filter(author=star).exists())
+        Post.objects.create(text='pull 1', author=star)
+        self.assertEqual(self.feed_texts(), ['pull 1', 'push 1'])
+        fan_follow.delete()
+        self.assertEqual(
+            TimelineEntry.objects.filter(
+                user=FollowTimelineTest.follower
+            ).count(), 2
+        )
+        self.assertEqual(self.feed_texts(), ['pull 1', 'push 1'])
+
+
+class PostSearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.other = User.objects.create_user(username=USERNAME_2)
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE, slug=GROUP_SLUG, description=GROUP_DESC
+        )
+        Post.objects.create(text='Зима близко', author=cls.author)
+        Post.objects.create(
+            text='Зима, зима и снова зима', author=cls.other, group=cls.group
+        )
+        Post.objects.create(text='Лето в Дорне', author=cls.author)
+
+    def found(self, **params):
+        response = self.client.get(reverse('search'), params)
+        return [post.text for post in response.context['page']]
+
+    def test_results_are_ranked_and_filtered(self):
+        """Поиск не зависит от регистра, чаще упомянутое слово выше,
+        фильтры по группе и автору сужают выдачу.
+        """
+        self.assertEqual(
+            self.found(q='ЗИМА'), ['Зима, зима и снова зима', 'Зима близко']
+        )
+        self.assertEqual(
+            self.found(q='зима', group=GROUP_SLUG),
+            ['Зима, зима и снова зима']
+        )
+        self.assertEqual(
+            self.found(q='зима', author=USERNAME), ['Зима близко']
+        )
+        self.assertEqual(self.found(q='"зима" OR (лето'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        post = Post.objects.get(text='Лето в Дорне')
+        post.text = 'Осень в Дорне'
+        post.save()
+        self.assertEqual(self.found(q='лето'), [])
+        self.assertEqual(self.found(q='осень'), ['Осень в Дорне'])
+        post.delete()
+        self.assertEqual(self.found(q='дорне'), [])
+
+    @override_settings(MAX_PAGE=2)
+    def test_cursor_pages_keep_query(self):
+        """Следующая страница поиска продолжает выдачу того же запроса."""
+        Post.objects.create(text='зима зима зима зима', author=self.author)
+        response = self.client.get(reverse('search'), {'q': 'зима'})
+        page = response.context['page']
+        self.assertContains(response, 'q=%D0%B7%D0%B8%D0%BC%D0%B0&amp;cursor=')
+        response = self.client.get(
+            reverse('search'),
+            {'q': 'зима', 'cursor': page.next_cursor}
+        )
+        self.assertEqual(
+            [post.text for post in response.context['page']],
+            ['Зима близко']
+        )
+
+    def test_rebuild_command_and_admin_search(self):
+        """Перестроенный индекс согласован с постами, админка ищет по нему.
+        """
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts (posts_post_fts, rank) "
+                "VALUES ('integrity-check', 1)"
+            )
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'ДОРНЕ'}
+        )
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Лето в Дорне']
+        )
+
+
+class IndexCacheTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        for number in range(settings.MAX_PAGE + 1):
+            Post.objects.create(text=f'post {number}', author=self.user)
+        self.guest_client = Client()
+
+    def test_index_pages_are_cached_separately(self):
+        """Каждая страница главной кэшируется под своим ключом."""
+        first = self.guest_client.get(URL_HOMEPAGE)
+        cursor = first.context['page'].next_cursor
+        second = self.guest_client.get(URL_HOMEPAGE, {'cursor': cursor})
+        self.assertContains(second, 'post 0')
+        self.assertNotContains(second, f'post {settings.MAX_PAGE}')
+
+    def test_cached_index_skips_database(self):
+        """Закэшированная страница главной отдаётся без запросов к базе,
+        и её фрагмент общий для гостя и авторизованного зрителя.
+        """
+        self.guest_client.get(URL_HOMEPAGE)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(URL_HOMEPAGE)
+        self.assertContains(response, f'post {settings.MAX_PAGE}')
+        author_client = Client()
+        author_client.force_login(self.user)
+        with self.assertNumQueries(2):
+            response = author_client.get(URL_HOMEPAGE)
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(response, 'Редактировать')
+
+    def test_post_changes_invalidate_index_cache(self):
+        """Создание, правка и удаление поста сразу видны на главной."""
+        self.guest_client.get(URL_HOMEPAGE)
+        post = Post.objects.create(text=CASH_TEXT, author=self.user)
+        self.assertContains(self.guest_client.get(URL_HOMEPAGE), CASH_TEXT)
+        post.text = POST_TEXT
+        post.save()
+        self.assertContains(self.guest_client.get(URL_HOMEPAGE), POST_TEXT)
+        post.delete()
+        self.assertNotContains(self.guest_client.get(URL_HOMEPAGE), POST_TEXT)
+
+    @override_settings(THUMBNAIL_WORKERS=2)
+    def test_finished_thumbnails_invalidate_index_cache(self):
+        """Готовые миниатюры сразу заменяют заглушку в кэше главной."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        with mock.patch.object(thumbnails.pool, 'submit'):
+            post = Post.objects.create(
+                text=CASH_TEXT, author=self.user, image=SimpleUploadedFile(
+                    'small.gif', small_gif, content_type='image/gif'
+                )
+            )
+            response = self.guest_client.get(URL_HOMEPAGE)
+        self.assertContains(response, 'card-img bg-light')
+        generation = feed_cache.generation()
+        thumbnails.pool.run_inline(post.image.name)
+        self.assertNotEqual(feed_cache.generation(), generation)
+        response = self.guest_client.get(URL_HOMEPAGE)
+        self.assertNotContains(response, 'card-img bg-light')
+        generation = feed_cache.generation()
+        thumbnails.pool.run_inline(post.image.name)
+        self.assertEqual(feed_cache.generation(), generation)
+
+
+class AutocompleteTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete.index.generation = None
+        User.objects.create_user(
+            username=USERNAME, first_name='Jon', last_name='Snow'
+        )
+        Group.objects.create(
+            title=GROUP_TITLE, slug=GROUP_SLUG, description=GROUP_DESC
+        )
+
+    def suggest(self, query):
+        response = self.client.get(reverse('autocomplete'), {'q': query})
+        return [row['url'] for row in response.json()['results']]
+
+    def test_prefix_of_any_word_matches(self):
+        """Подсказки ищутся по началу username, имени и названия группы,
+        а повторный запрос не обращается к базе.
+        """
+        self.assertEqual(self.suggest('jons'), [URL_PROFILE])
+        self.assertEqual(self.suggest('SNO'), [URL_PROFILE])
+        self.assertEqual(self.suggest('stark h'), [GROUP_POSTS])
+        self.assertEqual(self.suggest('the '), [GROUP_POSTS])
+        self.assertEqual(self.suggest('dorne'), [])
+        with self.assertNumQueries(0):
+            self.suggest('j')
+
+    def test_index_follows_saves_and_deletes(self):
+        """Правка и удаление пользователя и группы сразу видны в индексе."""
+        self.suggest('j')
+        user = User.objects.get(username=USERNAME)
+        user.last_name = 'Targaryen'
+        user.save()
+        Group.objects.create(title='Targaryen', slug='dragons')
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.suggest('targ'), ['/group/dragons/', URL_PROFILE]
+            )
+            self.assertEqual(self.suggest('snow'), [])
+        user.delete()
+        self.assertEqual(self.suggest('targ'), ['/group/dragons/'])
+
+    def test_other_workers_apply_changes_without_rebuild(self):
+        """Процесс, чей индекс отстал, дочитывает правки других процессов
+        из общего кэша, не обращаясь к базе.
+        """
+        self.suggest('j')
+        other_worker = autocomplete.PrefixIndex()
+        with mock.patch.object(autocomplete, 'index', other_worker):
+            User.objects.create_user(username='arya', first_name='Arya')
+            Group.objects.get(slug=GROUP_SLUG).delete()
+        autocomplete.index.checked = 0.0
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('ary'), ['/arya/'])
+            self.assertEqual(self.suggest('stark'), [])
+        self.assertEqual(
+            autocomplete.index.generation,
+            feed_cache.generation(autocomplete.GENERATION_KEY)
+        )
+
+    def test_incomplete_change_log_rebuilds_index(self):
+        """Если правки вытеснены из кэша, индекс строится из базы."""
+        self.suggest('j')
+        with mock.patch.object(
+            autocomplete, 'index', autocomplete.PrefixIndex()
+        ):
+            User.objects.create_user(username='arya')
+        cache.delete(autocomplete.change_key(
+            feed_cache.generation(autocomplete.GENERATION_KEY)
+        ))
+        autocomplete.index.checked = 0.0
+        self.assertEqual(self.suggest('ary'), ['/arya/'])
+
+
+class ConditionalGetTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username=USERNAME_3)
+        self.group = Group.objects.create(
+            title=GROUP_TITLE, slug=GROUP_SLUG, description=GROUP_DESC
+        )
+        self.post = Post.objects.create(
+            text=POST_TEXT, author=self.author, group=self.group
+        )
+        self.urls = (
+            URL_HOMEPAGE,
+            GROUP_POSTS,
+            URL_PROFILE,
+            f'/{USERNAME}/{self.post.id}/',
+        )
+
+    def revalidate(self, client, url, response):
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Повторный запрос с совпавшим ETag получает 304 без рендеринга,
+        гость получает и Last-Modified.
+        """
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    self.revalidate(self.client, url, response).status_code,
+                    HTTPStatus.NOT_MODIFIED
+                )
+        response = self.client.get(URL_HOMEPAGE)
+        not_modified = self.client.get(
+            URL_HOMEPAGE,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_and_viewer_change_validators(self):
+        """Правка поста, подписка и другой зритель дают новый ETag."""
+        responses = {url: self.client.get(url) for url in self.urls}
+        self.post.text = CASH_TEXT
+        self.post.save()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(self.client, url, response).status_code,
+                    HTTPStatus.OK
+                )
+        response = self.client.get(URL_PROFILE)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.revalidate(self.client, URL_PROFILE, response).status_code,
+            HTTPStatus.OK
+        )
+        response = self.client.get(URL_HOMEPAGE)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        self.assertEqual(
+            self.revalidate(reader_client, URL_HOMEPAGE, response).status_code,
+            HTTPStatus.OK
+        )
+        self.assertNotIn('Last-Modified', reader_client.get(URL_HOMEPAGE))
+
+    def test_post_page_validator_covers_csrf_cookie(self):
+        """Страница поста с формой комментария получает новый ETag,
+        когда у зрителя сменилась CSRF-cookie.
+        """
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        url = self.urls[-1]
+        reader_client.get(url)
+        self.assertIn(settings.CSRF_COOKIE_NAME, reader_client.cookies)
+        response = reader_client.get(url)
+        self.assertEqual(
+            self.revalidate(reader_client, url, response).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        reader_client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 64
+        self.assertEqual(
+            self.revalidate(reader_client, url, response).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_follow_feed_validator_covers_viewer_state(self):
+        """Лента подписок получает новый ETag после подписки зрителя и
+        пересчёта рекомендаций.
+        """
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        for url in (URL_FOLLOW, reverse('api_follow_index')):
+            with self.subTest(url=url):
+                response = reader_client.get(url)
+                self.assertEqual(
+                    self.revalidate(reader_client, url, response).status_code,
+                    HTTPStatus.NOT_MODIFIED
+                )
+                feed_cache.bump(suggestions.GENERATION_KEY)
+                self.assertEqual(
+                    self.revalidate(reader_client, url, response).status_code,
+                    HTTPStatus.OK
+                )
+                response = reader_client.get(url)
+                Follow.objects.create(user=self.reader, author=self.author)
+                self.assertEqual(
+                    self.revalidate(reader_client, url, response).status_code,
+                    HTTPStatus.OK
+                )
+                Follow.objects.filter(user=self.reader).delete()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username=USERNAME, first_name='Jon', last_name='Snow'
+        )
+        cls.reader = User.objects.create_user(username=USERNAME_3)
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE, slug=GROUP_SLUG, description=GROUP_DESC
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                text=f'{POST_TEXT} {number}',
+                author=cls.author,
+                group=cls.group
+            )
+            for number in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text=COMMENT_TEXT
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiTest.reader)
+
+    @override_settings(MAX_PAGE=2)
+    def test_feeds_are_paginated_by_cursor(self):
+        """Ленты API листаются курсором и отдают только поля из fields=."""
+        texts = [f'{POST_TEXT} {number}' for number in (2, 1, 0)]
+        urls = {
+            reverse('api_index'): self.client,
+            reverse('api_group_posts', args=[GROUP_SLUG]): self.client,
+            reverse('api_profile', args=[USERNAME]): self.client,
+            reverse('api_follow_index'): self.reader_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                first = client.get(url, {'fields': 'text,author'}).json()
+                self.assertEqual(first['results'], [
+                    {'text': text, 'author': USERNAME} for text in texts[:2]
+                ])
+                self.assertIsNone(first['previous'])
+                second = client.get(first['next']).json()
+                self.assertEqual(
+                    [post['text'] for post in second['results']], texts[2:]
+                )
+                self.assertIsNone(second['next'])
+
+    def test_post_and_profile_embed_counts(self):
+        """Пост и профиль отдают счётчики автора и комментарии."""
+        post = ApiTest.posts[0]
+        data = self.client.get(
+            reverse('api_post', args=[USERNAME, post.id])
+        ).json()
+        self.assertEqual(data['post']['comment_count'], 1)
+        self.assertEqual(data['post']['group'], GROUP_SLUG)
+        self.assertIsNone(data['post']['image'])
+        self.assertEqual(
+            [comment['text'] for comment in data['comments']],
+            [COMMENT_TEXT]
+        )
+        author = self.client.get(
+            reverse('api_profile', args=[USERNAME])
+        ).json()['author']
+        self.assertEqual(author, {
+            'username': USERNAME,
+            'full_name': 'Jon Snow',
+            'posts_count': 3,
+            'followers_count': 1,
+            'following_count': 0,
+        })
+
+    def test_errors(self):
+        """Неизвестное поле, чужой пост и гость в ленте подписок."""
+        response = self.client.get(reverse('api_index'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(
+            reverse('api_post', args=[USERNAME_3, ApiTest.posts[0].id])
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get(reverse('api_follow_index'))
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+
+@override_settings(COMMENTS_PAGE=2)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(text=POST_TEXT, author=cls.author)
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'comment {number}'
+            )
+        cls.url = reverse('post', args=[USERNAME, cls.post.id])
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_comments_are_loaded_by_pages(self):
+        """Пост показывает первую страницу комментариев, следующие
+        догружаются фрагментами по ссылке с курсором.
+        """
+        response = self.client.get(CommentsPaginationTest.url)
+        page = response.context['comments']
+        self.assertEqual(self.texts(page), ['comment 0', 'comment 1'])
+        self.assertNotContains(response, 'comment 2')
+        texts = []
+        url = reverse('post_comments', args=[USERNAME, self.post.id])
+        cursor = page.next_cursor
+        while cursor:
+            response = self.client.get(url, {'cursor': cursor})
+            self.assertTemplateUsed(response, 'posts/comment_list.html')
+            self.assertContains(response, 'js-more-comments', count=(
+                1 if response.context['page'].next_cursor else 0
+            ))
+            texts += self.texts(response.context['page'])
+            cursor = response.context['page'].next_cursor
+        self.assertEqual(texts, ['comment 2', 'comment 3', 'comment 4'])
+
+    def test_api_comments_are_paginated(self):
+        """API поста отдаёт первую страницу и ссылку на следующие."""
+        data = self.client.get(
+            reverse('api_post', args=[USERNAME, self.post.id])
+        ).json()
+        texts = [comment['text'] for comment in data['comments']]
+        url = data['comments_next']
+        while url:
+            page = self.client.get(url).json()
+            texts += [comment['text'] for comment in page['results']]
+            url = page['next']
+        self.assertEqual(texts, [f'comment {number}' for number in range(5)])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username=USERNAME_3)
+        Post.objects.create(text=POST_TEXT, author=self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.replica_caught_up()
+
+    def replica_caught_up(self):
+        """Последний сдвиг поколения ленты был давно."""
+        cache.set(f'{feed_cache.GENERATION_KEY}:changed', 0, None)
+
+    def get(self, client, url):
+        """Ответ и число запросов к каждой базе."""
+        counters = {alias: QueryCounter() for alias in self.databases}
+        with ExitStack() as stack:
+            for alias, counter in counters.items():
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter)
+                )
+            response = client.get(url)
+        return response, {
+            alias: counter.count for alias, counter in counters.items()
+        }
+
+    def test_reads_go_to_replica(self):
+        """Страницы для чтения не обращаются к основной базе."""
+        for client in (self.client, self.reader_client):
+            for url in (URL_HOMEPAGE, URL_PROFILE):
+                with self.subTest(url=url):
+                    response, queries = self.get(client, url)
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertEqual(queries['default'], 0)
+                    self.assertGreater(queries['replica'], 0)
+
+    def test_replica_is_chosen_once_per_request(self):
+        """Все чтения запроса идут на одну реплику, выбранную один раз."""
+        with mock.patch(
+            'yatube.db_router.random.choice', side_effect=lambda aliases:
+            aliases[0]
+        ) as choice:
+            _, queries = self.get(self.reader_client, URL_PROFILE)
+        choice.assert_called_once_with(['replica'])
+        self.assertGreater(queries['replica'], 1)
+
+    def test_write_pins_browser_to_primary(self):
+        """Запись идёт в основную базу, и потом браузер какое-то время
+        читает только из неё.
+        """
+        response, queries = self.get(
+            self.reader_client, reverse('profile_follow', args=[USERNAME])
+        )
+        self.assertEqual(queries['replica'], 0)
+        self.assertIn(settings.PRIMARY_PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            response.cookies[settings.PRIMARY_PIN_COOKIE]['max-age'],
+            settings.PRIMARY_PIN_SECONDS
+        )
+        _, queries = self.get(self.reader_client, URL_PROFILE)
+        self.assertEqual(queries['replica'], 0)
+        del self.reader_client.cookies[settings.PRIMARY_PIN_COOKIE]
+        self.replica_caught_up()
+        _, queries = self.get(self.reader_client, URL_PROFILE)
+        self.assertEqual(queries['default'], 0)
+
+    def test_fresh_feed_change_is_read_from_primary(self):
+        """Сразу после сдвига поколения страницы с ETag и кэшем
+        фрагментов читают из основной базы: строки отставшей реплики
+        остались бы в кэше под новым поколением.
+        """
+        Post.objects.create(text=POST_TEXT, author=self.author)
+        for url in (URL_HOMEPAGE, URL_PROFILE):
+            with self.subTest(url=url):
+                _, queries = self.get(self.client, url)
+                self.assertEqual(queries['replica'], 0)
+                self.assertGreater(queries['default'], 0)
+        cache.clear()
+        self.replica_caught_up()
+        _, queries = self.get(self.client, URL_HOMEPAGE)
+        self.assertEqual(queries['default'], 0)
+        self.assertGreater(queries['replica'], 0)
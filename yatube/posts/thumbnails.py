@@ -0,0 +1,215 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import feed_cache
+
+logger = logging.getLogger(__name__)
+
+# Варианты миниатюр, которые показывают шаблоны:
+# имя -> (размеры по возрастанию ширины, опции sorl).
+VARIANTS = {
+    'card': (
+        settings.POST_THUMBNAIL_SIZES,
+        {'crop': 'center', 'upscale': True},
+    ),
+}
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, умеющий только найти готовую миниатюру."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем же именем, что даёт get_thumbnail.
+
+        Опции дополняются так же, как в get_thumbnail, но картинка не
+        декодируется и не создаётся.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей sorl или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+
+backend = ReadyThumbnailBackend()
+
+
+def ready(image, variant):
+    """Готовые миниатюры варианта variant по возрастанию ширины."""
+    sizes, options = VARIANTS[variant]
+    thumbnails = (
+        backend.get_ready(image, geometry, **options) for geometry in sizes
+    )
+    return [thumbnail for thumbnail in thumbnails if thumbnail]
+
+
+def ready_many(images, variant):
+    """Готовые миниатюры для набора картинок: имя картинки -> список.
+
+    Вместо запроса к хранилищу ключей sorl на каждую миниатюру читает
+    все ключи одним get_many из кэша и одним запросом к базе.
+    """
+    sizes, options = VARIANTS[variant]
+    wanted = {
+        image.name: [
+            add_prefix(backend.thumbnail_file(image, geometry, **options).key)
+            for geometry in sizes
+        ]
+        for image in images
+    }
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return {image.name: ready(image, variant) for image in images}
+    keys = [key for keys in wanted.values() for key in keys]
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(KVStoreModel.objects.filter(
+            key__in=missing
+        ).values_list('key', 'value'))
+        # Как и sorl, запоминаем отсутствие ключа, чтобы не искать снова.
+        empty = cached_db_kvstore.EMPTY_VALUE
+        fetched = {key: found.get(key, empty) for key in missing}
+        kvstore.cache.set_many(
+            fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    return {
+        name: [
+            deserialize_image_file(values[key])
+            for key in keys if values[key] != cached_db_kvstore.EMPTY_VALUE
+        ]
+        for name, keys in wanted.items()
+    }
+
+
+class PageThumbnails:
+    """Миниатюры всех картинок страницы, читаемые одним пакетом.
+
+    Пакет загружается при первом обращении шаблона, так что страница
+    из кэша фрагментов не платит за него ни одного запроса.
+    """
+
+    def __init__(self, images, variant):
+        self.images = images
+        self.variant = variant
+        self.results = None
+
+    def get(self, image):
+        if self.results is None:
+            self.results = ready_many(self.images, self.variant)
+        return self.results[image.name]
+
+
+def prefetch(posts, variant='card'):
+    """Привязывает к картинкам постов общий пакет миниатюр."""
+    images = [post.image for post in posts if post.image]
+    batch = PageThumbnails(images, variant)
+    for image in images:
+        image.thumbnails = batch
+    return posts
+
+
+def generate(name):
+    """Создаёт все размеры всех вариантов; готовые пропускаются.
+
+    Возвращает число созданных миниатюр.
+    """
+    created = 0
+    for sizes, options in VARIANTS.values():
+        for geometry in sizes:
+            if backend.get_ready(name, geometry, **options) is None:
+                backend.get_thumbnail(name, geometry, **options)
+                created += 1
+    return created
+
+
+class ThumbnailPool:
+    """Пул потоков с ограниченной очередью для фоновой генерации.
+
+    Если очередь полна, задача отбрасывается: шаблон покажет заглушку
+    и поставит картинку в очередь снова при следующем показе.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.executor = None
+
+    def submit(self, name):
+        with self.lock:
+            if name in self.pending or not self.slots.acquire(False):
+                return False
+            self.pending.add(name)
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix='thumbnails'
+                )
+        self.executor.submit(self.run, name)
+        return True
+
+    def run(self, name):
+        try:
+            self.run_inline(name)
+        finally:
+            connection.close()
+            with self.lock:
+                self.pending.discard(name)
+            self.slots.release()
+
+    @staticmethod
+    def run_inline(name):
+        try:
+            created = generate(name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюры %s', name)
+            return
+        if created:
+            # Закэшированные фрагменты и ETag лент показывают заглушку
+            # вместо картинки, пока не сдвинется поколение.
+            feed_cache.bump()
+
+
+pool = ThumbnailPool(
+    settings.THUMBNAIL_WORKERS, settings.THUMBNAIL_QUEUE_SIZE
+)
+
+
+def schedule(name):
+    """Ставит генерацию миниатюр в пул после фиксации транзакции.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу после фиксации
+    в том же потоке.
+    """
+    if not name:
+        return
+    if settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: pool.submit(name))
+    else:
+        transaction.on_commit(lambda: pool.run_inline(name))
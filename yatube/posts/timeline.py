@@ -0,0 +1,186 @@
+from collections import defaultdict
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Q
+
+from .bulk import batched
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import MergedCursorPaginator
+
+BATCH_SIZE = 500
+
+
+def is_pulled(author_id):
+    """Посты автора читают при показе ленты, а не раскладывают."""
+    return UserStats.objects.filter(user_id=author_id, pulled=True).exists()
+
+
+def update_mode(author_id):
+    """Переключает режим автора, когда число подписчиков пересекло порог.
+
+    Режим хранится, а не выводится из счётчика на каждом запросе: посты,
+    написанные в прежнем режиме, переносятся при переключении, иначе они
+    пропали бы из лент или читались бы дважды.
+    """
+    stats = UserStats.objects.filter(user_id=author_id)
+    if stats.filter(
+        pulled=False, followers_count__gte=settings.FOLLOW_PULL_THRESHOLD
+    ).update(pulled=True):
+        start_pulling(author_id)
+    elif stats.filter(
+        pulled=True, followers_count__lt=settings.FOLLOW_PUSH_THRESHOLD
+    ).update(pulled=False):
+        start_pushing(author_id)
+
+
+def start_pulling(author_id):
+    """Посты автора теперь читаются при показе: разложенные копии лишние.
+    """
+    TimelineEntry.objects.filter(author_id=author_id).delete()
+
+
+def start_pushing(author_id):
+    """Раскладывает свежие посты автора всем подписчикам: пока автора
+    читали при показе, в их ленты они не попадали.
+    """
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', 'pub_date')
+    posts = list(posts[:settings.FOLLOW_TIMELINE_LENGTH])
+    followers = Follow.objects.filter(author_id=author_id)
+    followers = followers.values_list('user_id', flat=True)
+    for user_ids in batched(followers.iterator(), BATCH_SIZE):
+        write_entries(
+            TimelineEntry(
+                user_id=user_id,
+                post_id=pk,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for pk, pub_date in posts
+        )
+        trim(user_ids)
+
+
+def write_entries(entries):
+    """Пишет записи ленты порциями, пропуская уже существующие."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def trim(user_ids):
+    """Обрезает ленты до FOLLOW_TIMELINE_LENGTH записей.
+
+    Для каждого пользователя по индексу (user, -pub_date, -post) читается
+    ключ первой лишней записи; ленты короче предела на этом и
+    заканчиваются, остальные обрезаются одним DELETE по тому же индексу.
+    """
+    length = settings.FOLLOW_TIMELINE_LENGTH
+    for user_id in user_ids:
+        entries = TimelineEntry.objects.filter(user_id=user_id)
+        cutoff = entries.order_by('-pub_date', '-post_id').values_list(
+            'pub_date', 'post_id'
+        )[length:length + 1]
+        for pub_date, post_id in cutoff:
+            entries.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, post_id__lte=post_id)
+            ).delete()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    fan_out_many([post])
+
+
+def fan_out_many(posts):
+    """Раскладывает порцию новых постов: подписчики каждого автора
+    читаются один раз на все его посты.
+    """
+    by_author = defaultdict(list)
+    for post in posts:
+        by_author[post.author_id].append(post)
+    for author_id, author_posts in by_author.items():
+        if is_pulled(author_id):
+            continue
+        followers = Follow.objects.filter(author_id=author_id)
+        followers = followers.values_list('user_id', flat=True)
+        for user_ids in batched(followers.iterator(), BATCH_SIZE):
+            write_entries(
+                TimelineEntry(
+                    user_id=user_id,
+                    post_id=post.pk,
+                    author_id=author_id,
+                    pub_date=post.pub_date,
+                )
+                for user_id in user_ids
+                for post in author_posts
+            )
+            trim(user_ids)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика свежие посты нового автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by('-pub_date')
+    posts = posts.values_list('pk', 'pub_date')
+    write_entries(
+        TimelineEntry(
+            user_id=user_id,
+            post_id=pk,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for pk, pub_date in posts[:settings.FOLLOW_TIMELINE_LENGTH]
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался.
+    """
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def follow_page(user, cursor, fields=None):
+    """Страница ленты подписок: разложенные записи плюс посты тех авторов,
+    которых читают при показе, слитые по (pub_date, id).
+
+    Если заданы fields, строки читаются через values() и страница
+    состоит из словарей с этими полями поста.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    posts = Post.objects.all()
+    if fields is None:
+        entries = entries.select_related('post__author', 'post__group')
+        posts = posts.select_related('author', 'group')
+        from_entry = attrgetter('post')
+    else:
+        entries = entries.values(*(f'post__{field}' for field in fields))
+        posts = posts.values(*fields)
+        from_entry = unprefix
+    sources = [(entries, ('-pub_date', '-post_id'), from_entry)]
+    pulled = Follow.objects.filter(
+        user=user,
+        author__stats__pulled=True,
+    ).values_list('author_id', flat=True)
+    for author_id in pulled:
+        sources.append((
+            posts.filter(author_id=author_id), ('-pub_date', '-id'),
+            lambda post: post
+        ))
+    paginator = MergedCursorPaginator(sources, settings.MAX_PAGE, Post)
+    return paginator.get_page(cursor)
+
+
+def unprefix(row):
+    """Строка values() записи ленты под именами полей самого поста."""
+    return {key[len('post__'):]: value for key, value in row.items()}
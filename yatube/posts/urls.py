@@ -1,10 +1,34 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('new/', views.new_post, name='new_post'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='search'),
+    path('autocomplete/', views.suggest, name='autocomplete'),
+    path('api/v1/posts/', api.index, name='api_index'),
+    path('api/v1/follow/', api.follow_index, name='api_follow_index'),
+    path(
+        'api/v1/group/<slug:slug>/',
+        api.group_posts,
+        name='api_group_posts'
+    ),
+    path(
+        'api/v1/users/<str:username>/',
+        api.profile,
+        name='api_profile'
+    ),
+    path(
+        'api/v1/users/<str:username>/<int:post_id>/',
+        api.post_view,
+        name='api_post'
+    ),
+    path(
+        'api/v1/users/<str:username>/<int:post_id>/comments/',
+        api.post_comments,
+        name='api_post_comments'
+    ),
     path(
         '<str:username>/follow/',
         views.profile_follow,
@@ -20,6 +44,11 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path('group/<slug:slug>/', views.group_posts, name='group_posts'),
     path('<str:username>/', views.profile, name='profile'),
     path('<str:username>/<int:post_id>/', views.post_view, name='post'),
@@ -1,33 +1,55 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import condition
 
-from .forms import CommentForm, PostForm
+from yatube.db_router import primary
+
+from . import (autocomplete, comments, conditional, feed_cache, follow_graph,
+               search, suggestions, thumbnails, timeline)
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Follow, Group, Post, User
+from .paginators import CursorPaginator
+
 
+def paginate(request, posts):
+    """Страница ленты по токену курсора из GET-параметра cursor."""
+    paginator = CursorPaginator(posts, settings.MAX_PAGE)
+    page = paginator.get_page(request.GET.get('cursor'))
+    thumbnails.prefetch(page)
+    return page
 
+
+@condition(conditional.feed_etag, conditional.feed_last_modified)
 def index(request):
     post_list = Post.objects.select_related('author', 'group').all()
-    paginator = Paginator(post_list, settings.MAX_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    # Фрагменты главной общие для всех зрителей, и страница читается из
+    # базы, только если их нет в кэше шаблона.
+    page = SimpleLazyObject(lambda: paginate(request, post_list))
     return render(
         request,
         'posts/index.html',
-        {'page': page, }
+        {
+            'page': page,
+            'cursor': request.GET.get('cursor', ''),
+            'generation': feed_cache.generation(),
+            'cache_timeout': settings.INDEX_CACHE_TIMEOUT,
+        }
     )
 
 
+@condition(conditional.feed_etag, conditional.feed_last_modified)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = Post.objects.select_related(
         'group',
         'author'
     ).filter(group=group).all()
-    paginator = Paginator(posts, settings.MAX_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, posts)
     context = {
         'group': group,
         'posts': posts,
@@ -36,37 +58,111 @@ def group_posts(request, slug):
     return render(request, 'posts/group.html', context)
 
 
+@condition(conditional.author_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username
+    )
     posts = Post.objects.select_related(
         'author', 'group'
     ).filter(author=author).all()
-    paginator = Paginator(posts, settings.MAX_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    page = paginate(request, posts)
     context = {
         'page': page,
         'author': author,
         'posts': posts,
+        'following': follow_graph.is_following(request.user.pk, author.pk),
+        'suggestions': suggestions.for_user(request.user, exclude=author.pk),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(conditional.post_etag)
 def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    post = Post.objects.get(id=post_id)
+    """Пост с автором, его счётчиками, группой и первой страницей
+    комментариев за два запроса при любом числе комментариев.
+    """
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'),
+        id=post_id,
+        author__username=username
+    )
+    thumbnails.prefetch([post])
     form = CommentForm(request.POST or None)
     context = {
-        'author': author,
-        'posts': posts,
+        'author': post.author,
         'post': post,
         'form': form,
+        'comments': comments.page(post.id, None),
+        'following': follow_graph.is_following(
+            request.user.pk, post.author_id
+        ),
+        'suggestions': suggestions.for_user(
+            request.user, exclude=post.author_id
+        ),
     }
     return render(request, 'posts/post.html', context)
 
 
+@condition(conditional.author_etag)
+def post_comments(request, username, post_id):
+    """Следующая страница комментариев HTML-фрагментом для post.html."""
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        id=post_id,
+        author__username=username
+    )
+    context = {
+        'post': post,
+        'page': comments.page(post.id, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/comment_list.html', context)
+
+
+def post_search(request):
+    form = SearchForm(request.GET or None)
+    page = None
+    if form.is_valid():
+        posts = search.search_posts(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author']
+        )
+        paginator = CursorPaginator(
+            posts, settings.MAX_PAGE, ordering=('rank', '-id')
+        )
+        page = thumbnails.prefetch(
+            paginator.get_page(request.GET.get('cursor'))
+        )
+    query = request.GET.copy()
+    query.pop('cursor', None)
+    context = {
+        'form': form,
+        'page': page,
+        'query_string': query.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def suggest(request):
+    urls = {'user': 'profile', 'group': 'group_posts'}
+    results = [
+        {
+            'type': kind,
+            'label': label,
+            'url': reverse(urls[kind], args=[slug]),
+        }
+        for kind, slug, label in autocomplete.search(
+            request.GET.get('q', '')
+        )
+    ]
+    return JsonResponse({'results': results})
+
+
+@primary
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST' and form.is_valid():
@@ -79,6 +175,7 @@ def new_post(request):
     return render(request, 'posts/new_post.html', context)
 
 
+@primary
 @login_required
 def post_edit(request, username, post_id):
     author = get_object_or_404(User, username=username)
@@ -104,7 +201,9 @@ def post_edit(request, username, post_id):
     return render(request, 'posts/new_post.html', context)
 
 
+@primary
 @login_required
+@transaction.atomic
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -123,34 +222,43 @@ def add_comment(request, username, post_id):
 
 
 @login_required
+@condition(conditional.follow_etag)
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
-    paginator = Paginator(posts, settings.MAX_PAGE)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'page': page}
+    page = thumbnails.prefetch(
+        timeline.follow_page(request.user, request.GET.get('cursor'))
+    )
+    context = {
+        'page': page,
+        'suggestions': suggestions.for_user(request.user),
+    }
     return render(request, 'posts/follow.html', context)
 
 
+@primary
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    follow_check = Follow.objects.filter(user=user, author=author).exists()
-    if author != user and not follow_check:
-        Follow.objects.create(user=user, author=author)
+    if author != user and not follow_graph.is_following(user.pk, author.pk):
+        # Кэш подписок мог отстать от базы: повторная подписка не должна
+        # падать на уникальном индексе (user, author).
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+        except IntegrityError:
+            follow_graph.invalidate(user.pk)
     return redirect('profile', username=username)
 
 
+@primary
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
-    follow_check = Follow.objects.filter(user=user, author=author).exists()
-    if request.user != author and follow_check:
-        Follow.objects.filter(user=request.user, author=author).delete()
+    if author != user and follow_graph.is_following(user.pk, author.pk):
+        Follow.objects.filter(user=user, author=author).delete()
     return redirect('profile', username=username)
 
 
@@ -0,0 +1,279 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size + NEW.size;
+END;
+'''
+
+# Чтения не пишут время доступа сами: оно копится в памяти и сбрасывается
+# одной транзакцией не чаще раза в TOUCH_INTERVAL секунд или вместе с
+# ближайшей записью, иначе каждый get становился бы BEGIN IMMEDIATE.
+TOUCH_INTERVAL = 1.0
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite в режиме WAL, общий для всех процессов хоста.
+
+    Вытесняет давно не читанные записи при превышении MAX_ENTRIES или
+    MAX_SIZE (в байтах), incr атомарен между процессами. Целые числа
+    хранятся как INTEGER, остальное — pickle.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._busy_timeout = int(options.get('BUSY_TIMEOUT', 5000))
+        self._local = threading.local()
+
+    @property
+    def _touched(self):
+        """Ключ -> время чтения, ещё не записанное в базу."""
+        touched = getattr(self._local, 'touched', None)
+        if touched is None:
+            touched = self._local.touched = {}
+            self._local.flushed = time.time()
+        return touched
+
+    @property
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self._path, timeout=self._busy_timeout / 1000,
+                isolation_level=None, check_same_thread=False,
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            # INSERT OR REPLACE вызывает триггер удаления, только если
+            # включены рекурсивные триггеры; без них totals разойдётся.
+            db.execute('PRAGMA recursive_triggers=ON')
+            db.execute(f'PRAGMA busy_timeout={self._busy_timeout}')
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _write(self, sql, params=()):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = db.execute(sql, params).rowcount
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return result
+
+    def _store(self, db, key, value, timeout):
+        encoded = self._encode(value)
+        size = len(encoded) if isinstance(encoded, bytes) else 8
+        expires = self.get_backend_timeout(timeout)
+        db.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+            (key, encoded, expires, time.time(), size),
+        )
+
+    def _flush_touched(self, db):
+        """Записывает накопленные времена чтения в открытой транзакции."""
+        touched = self._touched
+        if touched:
+            db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(accessed, key) for key, accessed in touched.items()],
+            )
+            touched.clear()
+        self._local.flushed = time.time()
+
+    def _touch(self, key, now):
+        touched = self._touched
+        touched[key] = now
+        if now - self._local.flushed <= TOUCH_INTERVAL:
+            return
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            self._flush_touched(db)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _cull(self, db, key):
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM totals'
+        ).fetchone()
+        over_size = self._max_size and size > self._max_size
+        if entries <= self._max_entries and not over_size:
+            return
+        if self._cull_frequency == 0:
+            # Как и у DatabaseCache, 0 значит очистить кэш целиком;
+            # только что записанное значение сохраняется.
+            db.execute('DELETE FROM cache WHERE key != ?', (key,))
+            return
+        db.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        entries, size = db.execute(
+            'SELECT entries, bytes FROM totals'
+        ).fetchone()
+        if entries > self._max_entries:
+            doomed = max(entries // self._cull_frequency, 1)
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (doomed,),
+            )
+        while self._max_size and size > self._max_size:
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(entries // self._cull_frequency, 1),),
+            )
+            entries, size = db.execute(
+                'SELECT entries, bytes FROM totals'
+            ).fetchone()
+
+    def _set(self, key, value, timeout, only_new):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            if only_new:
+                row = db.execute(
+                    'SELECT expires FROM cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row and (row[0] is None or row[0] > time.time()):
+                    db.execute('COMMIT')
+                    return False
+            self._flush_touched(db)
+            self._store(db, key, value, timeout)
+            self._cull(db, key)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._set(key, value, timeout, only_new=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._set(key, value, timeout, only_new=False)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            self._write(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, now),
+            )
+            return default
+        if now - accessed > TOUCH_INTERVAL:
+            self._touch(key, now)
+        return self._decode(value)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return bool(self._write(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        ))
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = self._decode(row[0]) + delta
+            encoded = self._encode(value)
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (encoded, time.time(), key),
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write('DELETE FROM cache WHERE key = ?', (key,))
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def clear(self):
+        self._write('DELETE FROM cache')
@@ -0,0 +1,57 @@
+import datetime
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+# Состояние текущего запроса: реплика, выбранная для его чтений, и была
+# ли запись. Вне запросов (команды, фоновые потоки) всё идёт в основную
+# базу.
+state = threading.local()
+
+
+def choose_replica():
+    """Случайная реплика из DATABASE_REPLICAS или None, если их нет.
+
+    Выбирается один раз на запрос: все его чтения видят одну и ту же
+    копию базы, даже если реплики отстают на разное время.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+def avoid_lag(changed_at):
+    """Переводит оставшиеся чтения запроса в основную базу, если данные
+    менялись в changed_at, меньше PRIMARY_PIN_SECONDS назад: реплика
+    могла ещё не получить изменение.
+    """
+    lag = datetime.timedelta(seconds=settings.PRIMARY_PIN_SECONDS)
+    if changed_at is not None and timezone.now() - changed_at < lag:
+        state.replica = None
+
+
+def primary(view):
+    """Помечает view, которая пишет: все её запросы идут в основную базу,
+    включая чтения перед записью.
+    """
+    view.use_primary = True
+    return view
+
+
+class ReplicaRouter:
+    """Чтения GET-запросов — на реплику, выбранную для запроса,
+    всё остальное — в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(state, 'replica', None) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
@@ -0,0 +1,106 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from yatube.db_router import choose_replica, state
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def count_queries():
+    """Считает запросы ко всем базам внутри блока with."""
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+def query_budget(url_name):
+    """Бюджет запросов для имени маршрута из QUERY_BUDGETS."""
+    return settings.QUERY_BUDGETS.get(url_name, settings.QUERY_BUDGET)
+
+
+class QueryBudgetMiddleware:
+    """Пишет в лог запросы, превысившие бюджет SQL-запросов маршрута.
+
+    При DEBUG число запросов и их время отдаются в заголовках ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        budget = query_budget(url_name)
+        duration = counter.duration * 1000
+        if counter.count > budget:
+            logger.warning(
+                'Маршрут %s: %d SQL-запросов за %.1f мс при бюджете %d',
+                url_name or request.path, counter.count, duration, budget,
+            )
+        if settings.DEBUG:
+            response['X-DB-Queries'] = str(counter.count)
+            response['X-DB-Time'] = f'{duration:.1f}'
+        return response
+
+
+class ReplicaMiddleware:
+    """Выбирает реплику для чтений безопасного запроса.
+
+    Запросы с записью, view с пометкой primary и браузеры, которые
+    недавно что-то записали, читают из основной базы: после записи
+    ставится cookie PRIMARY_PIN_COOKIE на PRIMARY_PIN_SECONDS секунд,
+    чтобы пользователь сразу видел свои изменения, даже если реплика
+    отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.replica = None
+        if (request.method in ('GET', 'HEAD')
+                and settings.PRIMARY_PIN_COOKIE not in request.COOKIES):
+            state.replica = choose_replica()
+        state.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = state.wrote
+            state.replica = None
+            state.wrote = False
+        if wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.PRIMARY_PIN_COOKIE, '1',
+                max_age=settings.PRIMARY_PIN_SECONDS, httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'use_primary', False):
+            state.replica = None
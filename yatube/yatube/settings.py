@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.middleware.QueryBudgetMiddleware',
+    'yatube.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -64,9 +66,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живёт между запросами воркера: без переподключения
+        # и повторной настройки PRAGMA на каждый запрос.
+        'CONN_MAX_AGE': 0 if DEBUG else 600,
+    },
+    # Реплика для чтения. Локально это копия основной базы, например
+    # sqlite3 db.sqlite3 ".backup replica.sqlite3"; в тестах она
+    # совпадает с основной.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'CONN_MAX_AGE': 0 if DEBUG else 600,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Выполняются на каждом новом соединении SQLite (yatube.sqlite.configure).
+# WAL пускает читателей параллельно с писателем, synchronous=NORMAL в WAL
+# не теряет целостность при сбое процесса, busy_timeout заставляет ждать
+# блокировку вместо «database is locked». cache_size < 0 задан в КиБ.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+# transaction.atomic начинается с BEGIN IMMEDIATE (см. yatube.sqlite).
+SQLITE_IMMEDIATE_TRANSACTIONS = True
+
+DATABASE_ROUTERS = ['yatube.db_router.ReplicaRouter']
+# Псевдонимы баз, с которых читают GET-запросы; пусто — всё из default.
+DATABASE_REPLICAS = []
+# Предельное отставание реплик: после записи браузер столько секунд
+# читает из основной базы, а после сдвига поколения ленты — все страницы
+# с ETag (posts.conditional.settle).
+PRIMARY_PIN_SECONDS = 10
+PRIMARY_PIN_COOKIE = 'primary_pin'
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -96,11 +134,52 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# В продакшене collectstatic добавляет хеш к именам файлов и кладёт рядом
+# сжатые .gz и .br; при DEBUG статика берётся из приложений как есть.
+STATICFILES_STORAGE = (
+    'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+    else 'yatube.staticfiles.CompressedManifestStorage'
+)
 
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Фоновая генерация миниатюр: потоков на процесс и длина очереди.
+# При 0 потоков миниатюры создаются в потоке запроса после фиксации.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUEUE_SIZE = 100
+
+# Размеры миниатюр карточки поста для srcset и ширина по умолчанию для src.
+POST_THUMBNAIL_SIZES = ('480x170', '960x339', '1440x508')
+POST_THUMBNAIL_WIDTH = 960
+
+# Загруженные картинки постов ужимаются до этой стороны и перекодируются.
+POST_IMAGE_MAX_SIZE = 1920
+POST_IMAGE_FORMAT = 'WEBP'
+POST_IMAGE_QUALITY = 80
+
+# Экономия от пережатия картинок пишется в posts.images на уровне INFO.
+# В консоль она выводится только при DEBUG (тесты идут с DEBUG = False и
+# не печатают её); на сервере записи забирает обработчик, настроенный
+# при развёртывании.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+    },
+    'handlers': {
+        'debug_console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['require_debug_true'],
+        },
+    },
+    'loggers': {
+        'posts.images': {'handlers': ['debug_console'], 'level': 'INFO'},
+    },
+}
+
 
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = 'index'
@@ -111,8 +190,71 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MAX_PAGE = 10
 
+# Комментариев на странице поста и в каждой догружаемой порции.
+COMMENTS_PAGE = 20
+
+FOLLOW_TIMELINE_LENGTH = 1000
+
+# С FOLLOW_PULL_THRESHOLD подписчиков посты автора перестают раскладываться
+# по лентам и читаются при показе, ниже FOLLOW_PUSH_THRESHOLD — снова
+# раскладываются. Зазор не даёт переключать режим туда и обратно при
+# каждой подписке и отписке у самого порога.
+FOLLOW_PULL_THRESHOLD = 10000
+FOLLOW_PUSH_THRESHOLD = 9000
+
+# Сколько живут в кэше подписки пользователя (posts.follow_graph); записи
+# подписок сбрасывают их сразу, срок лишь ограничивает забытые записи.
+FOLLOW_GRAPH_TIMEOUT = 24 * 60 * 60
+
+# Рекомендаций на пользователя: хранит build_suggestions и показывает
+# карточка автора, уже прочитанные авторы отсеиваются при показе.
+SUGGESTIONS_STORED = 10
+SUGGESTIONS_SHOWN = 5
+
+INDEX_CACHE_TIMEOUT = 60 * 60
+
+QUERY_BUDGET = 20
+
+# Потолки маршрутов с формами и подписками измерены на запросах, которые
+# действительно пишут (posts.tests.test_queries).
+QUERY_BUDGETS = {
+    'index': 6,
+    'follow_index': 7,
+    'group_posts': 6,
+    'profile': 8,
+    'post': 8,
+    'post_comments': 6,
+    'post_edit': 7,
+    'search': 6,
+    'add_comment': 7,
+    'autocomplete': 2,
+    'new_post': 12,
+    'profile_follow': 17,
+    'profile_unfollow': 13,
+    'api_index': 3,
+    'api_follow_index': 5,
+    'api_group_posts': 4,
+    'api_profile': 6,
+    'api_post': 7,
+    'api_post_comments': 6,
+}
+
+# Общий для всех процессов gunicorn кэш: поколение ленты и фрагменты
+# страниц видны каждому воркеру сразу после записи.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50_000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+            'CULL_FREQUENCY': 10,
+            'BUSY_TIMEOUT': 5000,
+        },
     }
 }
+
+# manage.py test: временный кэш и миниатюры без фоновых потоков, как в
+# conftest.py для pytest.
+TEST_RUNNER = 'yatube.test_runner.TestRunner'
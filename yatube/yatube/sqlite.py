@@ -0,0 +1,38 @@
+from django.conf import settings
+
+
+def apply_pragmas(cursor, pragmas=None):
+    """Выполняет PRAGMA из SQLITE_PRAGMAS на соединении или курсоре sqlite3.
+    """
+    if pragmas is None:
+        pragmas = settings.SQLITE_PRAGMAS
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def begin_immediate(connection):
+    """BEGIN IMMEDIATE вместо BEGIN для transaction.atomic.
+
+    Отложенная транзакция, которая сначала читает, а потом пишет,
+    получает «database is locked» сразу, без ожидания busy_timeout, если
+    другой процесс успел начать запись. Транзакция, захватившая блокировку
+    записи с самого начала, просто ждёт своей очереди.
+    """
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик connection_created: настраивает новое соединение SQLite.
+
+    PRAGMA действуют до закрытия соединения, поэтому с CONN_MAX_AGE
+    выполняются один раз на соединение, а не на каждый запрос. Они идут
+    через соединение sqlite3 в обход курсора Django, иначе попадают в
+    счётчик QueryBudgetMiddleware того запроса, что открыл соединение.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    apply_pragmas(connection.connection)
+    if settings.SQLITE_IMMEDIATE_TRANSACTIONS:
+        connection._start_transaction_under_autocommit = (
+            lambda: begin_immediate(connection)
+        )
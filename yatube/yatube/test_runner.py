@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def isolated_settings(directory):
+    """Настройки на весь тестовый прогон, включая setUpClass.
+
+    Тесты чистят кэш, поэтому он лежит во временном каталоге directory,
+    а не в общем кэше сайта. Миниатюры создаются в потоке теста: фоновый
+    поток писал бы в тестовую базу одновременно с её очисткой после теста.
+    """
+    cache = {
+        **settings.CACHES['default'],
+        'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+    }
+    return override_settings(
+        CACHES={'default': cache},
+        THUMBNAIL_WORKERS=0,
+    )
+
+
+class TestRunner(DiscoverRunner):
+    """Запуск через manage.py test с теми же настройками, что и в pytest
+    (см. conftest.py).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.directory = tempfile.mkdtemp()
+        self.settings = isolated_settings(self.directory)
+        self.settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,8 +1,12 @@
+import re
+
 from django.conf import settings
 from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from yatube import staticfiles
 
 urlpatterns = [
     path('auth/', include('users.urls')),
@@ -24,3 +28,11 @@ if settings.DEBUG:
         settings.STATIC_URL,
         document_root=settings.STATIC_ROOT
     )
+else:
+    # Лёгкая раздача собранной статики, если перед Django нет nginx.
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')),
+            staticfiles.serve
+        ),
+    ]